@@ -0,0 +1,129 @@
+# chroma_registry.py - one Chroma client per process and cached collection handles
+import threading
+from typing import Optional, Union
+
+import chromadb
+from chromadb.api.models.Collection import Collection
+from chromadb.api.types import EmbeddingFunction
+from loguru import logger
+
+from .config import settings
+from .embeddings import embedding_backend
+
+CHROMA_PATH = "./db/"
+BACKEND_KEY = "embedding_backend"
+
+
+def collection_backend(collection: Collection) -> str:
+    "Backend that built the collection; the ones without metadata predate the choice (OpenAI)"
+    metadata = collection.metadata or {}
+    return metadata.get(BACKEND_KEY) or f"openai:{settings.OPENAI_MODEL_NAME_EMBEDDING}"
+
+
+class ChromaRegistry:
+    """
+    Owns the PersistentClient and the collection handles. Resolving a handle
+    costs a metadata lookup, so it is done once per collection and reused;
+    `delete` / `invalidate` drop the cached handle when the collection goes
+    away (or was changed from outside, e.g. another process).
+
+    Every collection records the embedding backend that built it; opening it
+    with another backend configured is refused, since vectors of two models
+    are not comparable. Only an explicit re-seed / re-ingest rebuilds it
+    (`rebuild`, through tmp_databases.query.reset_collection, which also
+    clears what was derived from it).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._client: Union[chromadb.ClientAPI, None] = None  # type: ignore
+        self._embedding_function: Union[EmbeddingFunction, None] = None
+        self._collections: dict[str, Collection] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> "chromadb.ClientAPI":  # type: ignore
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    @property
+    def embedding_function(self) -> EmbeddingFunction:
+        if self._embedding_function is None:
+            self._embedding_function = embedding_backend().chroma_function()
+        return self._embedding_function
+
+    @staticmethod
+    def _check_backend(name: str, collection: Collection) -> None:
+        built_with = collection_backend(collection)
+        if built_with != embedding_backend().id:
+            raise ValueError(
+                f"Collection {name} was built with {built_with}, "
+                f"EMBEDDING_BACKEND is {embedding_backend().id}; re-ingest it"
+            )
+
+    def get(self, name: str) -> Collection:
+        "Handle of an existing collection; raises if it does not exist"
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self.client.get_collection(
+                name=name,
+                embedding_function=self.embedding_function,  # type: ignore
+            )
+            self._check_backend(name, collection)
+            with self._lock:
+                collection = self._collections.setdefault(name, collection)
+        return collection
+
+    def get_or_create(self, name: str, metadata: Optional[dict] = None) -> Collection:
+        collection = self._collections.get(name)
+        if collection is None:
+            backend_id = embedding_backend().id
+            metadata = {**(metadata or {}), BACKEND_KEY: backend_id}
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata=metadata,
+                embedding_function=self.embedding_function,  # type: ignore
+            )
+            self._check_backend(name, collection)
+            with self._lock:
+                collection = self._collections.setdefault(name, collection)
+        return collection
+
+    def is_stale(self, name: str) -> bool:
+        "True when the collection exists but was built with another embedding backend"
+        if name not in self.names():
+            return False
+        collection = self.client.get_collection(
+            name=name,
+            embedding_function=self.embedding_function,  # type: ignore
+        )
+        return collection_backend(collection) != embedding_backend().id
+
+    def rebuild(self, name: str, metadata: Optional[dict] = None) -> Collection:
+        "Drop the collection and create it empty for the current backend"
+        if name in self.names():
+            self.delete(name)
+        self.invalidate(name)
+        return self.get_or_create(name, metadata)
+
+    def delete(self, name: str) -> None:
+        self.invalidate(name)
+        self.client.delete_collection(name=name)
+        logger.debug(f"Deleted chroma collection {name}")
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        "Forget one cached handle (or all of them when name is None)"
+        with self._lock:
+            if name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(name, None)
+
+    def names(self) -> list[str]:
+        return [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+
+
+chroma = ChromaRegistry(CHROMA_PATH)
@@ -27,6 +27,53 @@ class __Settings(BaseSettings):
     OPENAI_MODEL_NAME_IMAGE: str = Field("Model for image generation")
     OPENAI_API_KEY: str = Field("Api key")
 
+    OPENAI_MAX_CONNECTIONS: int = Field(50, description="Pooled keep-alive connections to the OpenAI API")
+    OPENAI_MAX_CONCURRENCY: int = Field(16, description="Model calls in flight at once per process")
+    OPENAI_TIMEOUT_SECONDS: float = Field(30.0, description="Read timeout of a single OpenAI call")
+
+    EMBEDDING_BACKEND: str = Field("openai", description="openai | onnx (local MiniLM on CPU) | hashing (local, no model)")
+    LOCAL_EMBEDDING_DIM: int = Field(1024, description="Vector size of the hashing backend")
+
+    EMBEDDING_CACHE_PATH: str = Field("embeddings_cache.db", description="SQLite file of the query embedding cache")
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = Field(2048, description="Vectors kept in the in-process LRU tier")
+    EMBEDDING_CACHE_MAX_ROWS: int = Field(100_000, description="Rows kept on disk before the oldest are evicted")
+
+    STT_MAX_CONCURRENCY: int = Field(8, description="Audio clips transcribed at once per process")
+    STT_MAX_UPLOAD_BYTES: int = Field(25 * 1024 * 1024, description="Largest clip accepted (OpenAI limit is 25 MB)")
+
+    SEED_IN_BACKGROUND: bool = Field(True, description="Seed after the server is ready instead of before")
+    INGEST_WORKERS: int = Field(2, description="Pdfs parsed and embedded in parallel")
+    RETRIEVAL_MODE: str = Field("hybrid", description="Default retrieval: vector | hybrid (BM25 + vector) | fast (BM25 when decisive)")
+    HYBRID_CANDIDATES: int = Field(20, description="Candidates taken from each ranking before rank fusion")
+    LEXICAL_DECISIVE_RATIO: float = Field(1.5, description="BM25 top score over runner-up needed to skip the embedding")
+    VECTOR_INDEX_ENABLED: bool = Field(True, description="Serve the hot collections from an in-memory NumPy index")
+    VECTOR_INDEX_COLLECTIONS: list[str] = Field(["my_db", "insurance_docs"], description="Collections mirrored in memory")
+    VECTOR_INDEX_QUANTIZATION: str = Field("float32", description="float32 | int8 (4x smaller, near-exact ranking)")
+    VECTOR_INDEX_DIR: str = Field("vector_index", description="Directory of the memory-mapped .npy files")
+    QUERY_FANOUT_CONCURRENCY: int = Field(8, description="Collections searched at once by a fan-out query")
+
+    DEFAULT_COUNTRY_CODE: str = Field("40", description="Country code assumed for phone numbers given without one")
+
+    DB_POOL_SIZE: int = Field(5, description="Pooled SQLite connections of app.db (WAL: readers in parallel, one writer)")
+    DB_MAX_OVERFLOW: int = Field(10, description="Extra connections opened under load")
+    DB_BUSY_TIMEOUT_MS: int = Field(5000, description="How long a connection waits for the write lock")
+    DB_CACHE_KB: int = Field(20_000, description="SQLite page cache per connection")
+    DB_MMAP_BYTES: int = Field(256 * 1024 * 1024, description="SQLite memory-mapped I/O window")
+
+    CALL_SESSIONS_MAX: int = Field(10_000, description="Calls remembered per worker (least recently active dropped first)")
+    CALL_SESSION_IDLE_SECONDS: float = Field(2 * 3600, description="A call silent for this long is dropped from the registry")
+
+    MESSAGE_FLUSH_INTERVAL_SECONDS: float = Field(0.5, description="How often queued conversation messages are written")
+    MESSAGE_FLUSH_MAX_BATCH: int = Field(256, description="Queued messages that trigger an early flush")
+
+    TTS_CACHE_DIR: str = Field("out/tts_cache", description="Directory of the content-addressed TTS cache")
+    TTS_CACHE_MAX_BYTES: int = Field(500 * 1024 * 1024, description="Disk budget of the TTS cache")
+
+    ANSWER_CACHE_PATH: str = Field("cache.db", description="SQLite file of the semantic answer cache")
+    ANSWER_CACHE_SIMILARITY: float = Field(0.95, description="Cosine similarity needed to reuse a cached answer")
+    ANSWER_CACHE_TTL_SECONDS: int = Field(24 * 3600, description="Cached answers older than this are ignored")
+    ANSWER_CACHE_HOT_ITEMS: int = Field(512, description="Answers per scope kept in memory")
+
 # Always use this settings rather than instantiating __Settings directly
 settings = __Settings()  # type: ignore
 
@@ -1,29 +1,74 @@
 # core_functions.py
-import unicodedata
-from openai import OpenAI
+import asyncio
+import json
 import re
 from fastapi import HTTPException, status
-import PyPDF2
 import os
-import uuid
 from pathlib import Path
-import requests
 from loguru import logger
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
-from typing import Any, Dict, List, Union, Tuple
+from typing import Any, AsyncIterator, Dict, List, Literal, Union, Tuple
 
 # local imports
-from .populate import collection, openai_embedding
+from .populate import faq_collection, FAQ_SCOPE
+from .embedding_cache import embed_query, aembed_query
+from . import providers
+from .tts_cache import tts_cache
 from .config import settings
+from .tmp_databases.cache import qa_store
+from .tmp_databases.page_index import page_store
+from .tmp_databases.lexical import is_decisive, lexical_index, rrf_fuse
+from .vector_index import vector_tier
+from .repo import SMS_RE, HUMAN_RE, _normalize as _strip_accents
+
+
+def _faq_vector_results(query_embedding: List[float], k: int) -> Dict[str, Any]:
+    "Nearest FAQ questions, from the in-memory index when it is loaded"
+    index = vector_tier.get(FAQ_SCOPE)
+    if index is None:
+        return faq_collection().query(query_embeddings=[query_embedding], n_results=k)  # type: ignore
+    (top,) = index.search(query_embedding, k)  # type: ignore
+    return {
+        "ids": [[index.ids[i] for i, _ in top]],
+        "documents": [[index.documents[i] for i, _ in top]],
+        "distances": [[dist for _, dist in top]],
+    }
 
 
-def get_top_answers(query: str, k: int):
+def get_top_answers(
+    query: str,
+    k: int,
+    query_embedding: Union[List[float], None] = None,
+    mode: Union[str, None] = None,
+):
     "Function that will look the local chroma db collection and retrieve top k answers"
-    query_embedding = openai_embedding.embed_with_retries(query)
-    results = collection.query(query_embeddings=query_embedding, n_results=k)
-    return results
+    mode = mode or settings.RETRIEVAL_MODE
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    if mode == "vector":
+        return _faq_vector_results(query_embedding, k)
+
+    # hybrid: intrebarile similare semantic + cele care contin termenii exacti
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    vector = _faq_vector_results(query_embedding, candidates)
+    lexical = lexical_index.search(FAQ_SCOPE, query, candidates)
+    questions = dict(zip(vector["ids"][0], vector["documents"][0]))  # type: ignore
+    questions.update({h["id"]: h["text"] for h in lexical if h["id"] not in questions})
+    fused = rrf_fuse([vector["ids"][0], [h["id"] for h in lexical]], k)
+    ids = [doc_id for doc_id, _ in fused]
+    return {"ids": [ids], "documents": [[questions[i] for i in ids]]}
+
+
+def decisive_faq_answers(query: str, k: int) -> Union[Dict[str, Any], None]:
+    """
+    Fast mode: the FAQ entries matched by BM25 when the lexical match is
+    decisive (same shape as get_top_answers), None when the vector path is needed.
+    """
+    hits = lexical_index.search(FAQ_SCOPE, query, k)
+    if not is_decisive(hits, settings.LEXICAL_DECISIVE_RATIO):
+        return None
+    return {"ids": [[h["id"] for h in hits]], "documents": [[h["text"] for h in hits]]}
 
 
 # ---- Helpers ----
@@ -100,8 +145,7 @@ def _build_summary(docs: List[str], max_chars: int = 1600) -> str:
     return "\n".join(parts)
 
 
-async def generate_response(answers: Dict[str, Any], user_query: str) -> str:
-    "Generate the response using OpenAI API"
+def _response_summary(answers: Dict[str, Any]) -> str:
     logger.debug(f"Answers: {answers}")
     items = _coerce_docs(answers)
     summary = _build_summary(items)
@@ -115,6 +159,10 @@ async def generate_response(answers: Dict[str, Any], user_query: str) -> str:
                 "message": "Could not make the summary of the response try 1 better",
             },
         )
+    return summary
+
+
+def _build_response_chain():
     system_template = (
         "You are a professional call center assistant for ByteMe Insurance. "
         "Always answer in the shortest possible way: 1 sentence if possible, maximum 2. "
@@ -135,14 +183,15 @@ async def generate_response(answers: Dict[str, Any], user_query: str) -> str:
         ]
     )
 
-    model_text = ChatOpenAI(
-        model=settings.OPENAI_MODEL_NAME_TEXT,
-        temperature=0.2,
-        max_tokens=100,
-    )  # type: ignore
+    return prompt_tmpl | providers.chat_model(temperature=0.2, max_tokens=100) | StrOutputParser()
+
 
-    chain = prompt_tmpl | model_text | StrOutputParser()
-    extra: str = await chain.ainvoke({"summary": summary, "question": user_query})
+async def generate_response(answers: Dict[str, Any], user_query: str) -> str:
+    "Generate the response using OpenAI API"
+    summary = _response_summary(answers)
+    chain = providers.chain("response", _build_response_chain)
+    async with providers.limit():
+        extra: str = await chain.ainvoke({"summary": summary, "question": user_query})
     extra = (extra or "").strip()
 
     # hard stop 2 propozitii
@@ -152,106 +201,226 @@ async def generate_response(answers: Dict[str, Any], user_query: str) -> str:
     return extra
 
 
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
+MAX_SPOKEN_SENTENCES = 2
+
+
+async def stream_sentences(
+    answers: Dict[str, Any], user_query: str
+) -> AsyncIterator[str]:
+    """
+    Same answer as generate_response, but streamed from the model and yielded
+    one sentence at a time as soon as the sentence is complete.
+    """
+    summary = _response_summary(answers)
+    chain = providers.chain("response", _build_response_chain)
+    buffer = ""
+    sent = 0
+    async with providers.limit():
+        async for token in chain.astream({"summary": summary, "question": user_query}):
+            buffer += token
+            while (m := _SENTENCE_END_RE.search(buffer)) is not None:
+                sentence, buffer = buffer[: m.end()].strip(), buffer[m.end() :]
+                if sentence:
+                    yield sentence
+                    sent += 1
+                if sent >= MAX_SPOKEN_SENTENCES:
+                    return
+    if buffer.strip():
+        yield buffer.strip()
+
+
 async def final_response(prompt: str) -> str:
-    answers = get_top_answers(query=prompt, k=3)
+    # aceeasi intrebare, acelasi text: nici embedding, nici LLM
+    cached = qa_store.get_exact(prompt, scope=FAQ_SCOPE)
+    if cached is not None:
+        return cached
+
+    if settings.RETRIEVAL_MODE == "fast":
+        answers = await asyncio.to_thread(decisive_faq_answers, prompt, 3)
+        if answers is not None:
+            gpt_answer = await generate_response(answers, user_query=prompt)
+            qa_store.save_qa(prompt, gpt_answer, None, scope=FAQ_SCOPE)
+            return gpt_answer
+
+    # aceeasi intrebare (sau una foarte apropiata) nu mai ajunge la LLM
+    query_embedding = await aembed_query(prompt)
+    cached = qa_store.get_answer(prompt, query_embedding, scope=FAQ_SCOPE)
+    if cached is not None:
+        return cached
+
+    answers = await asyncio.to_thread(get_top_answers, prompt, 3, query_embedding)
     logger.debug(f"Top 3 answers : {answers}, generated from prompt : {prompt}")
     gpt_answer = await generate_response(answers, user_query=prompt)  # type: ignore
+    qa_store.save_qa(prompt, gpt_answer, query_embedding, scope=FAQ_SCOPE)
     return gpt_answer
 
 
-def list_to_answers_dict(lst: List[str]) -> Dict[str, Any]:
+def list_to_answers_dict(lst: List[Union[str, Dict[str, Any]]]) -> Dict[str, Any]:
     """
-    Convertește o listă de string-uri într-un dict compatibil generate_response.
+    Convertește o listă de string-uri (sau hit-uri din query_db) într-un dict
+    compatibil generate_response.
     Cheia va fi doc_1, doc_2, ..., iar payload-ul minim are câmpul 'text'.
     """
-    return {f"doc_{i + 1}": {"text": s} for i, s in enumerate(lst)}
+    return {
+        f"doc_{i + 1}": {"text": s["text"] if isinstance(s, dict) else s}
+        for i, s in enumerate(lst)
+    }
 
 
-async def final_response_gpt(query: str, lst: List[str]) -> str:
+async def final_response_gpt(
+    query: str,
+    lst: List[Union[str, Dict[str, Any]]],
+    scope: Union[str, None] = None,
+    semantic: bool = True,
+) -> str:
+    """
+    Answer `query` from the retrieved chunks. With a `scope` (the collection
+    name) the answer goes through the answer cache of that collection: exact
+    question text first, then, if `semantic`, by similarity (one embedding;
+    the fast mode skips it).
+    """
     logger.debug(f"Prompt was : {query}")
+    query_embedding = None
+    if scope is not None:
+        cached = qa_store.get_exact(query, scope=scope)
+        if cached is not None:
+            return cached
+    if scope is not None and semantic:
+        query_embedding = await aembed_query(query)
+        cached = qa_store.get_answer(query, query_embedding, scope=scope)
+        if cached is not None:
+            return cached
+
     for i in range(len(lst)):
         logger.debug(f"Match {i} was : {lst[i]}")
     #     logger.debug(f"Responses collected {lst}, with prompt {query}")
     answers: Dict[str, Any] = list_to_answers_dict(lst)
     gpt_answer = await generate_response(answers, query)
     logger.debug(f"Generated response from gpt : {gpt_answer}")
+    if scope is not None:
+        qa_store.save_qa(query, gpt_answer, query_embedding, scope=scope)
     return gpt_answer
 
 
-async def generate_audio(story: str) -> str:
+async def stream_answer_audio(prompt: str) -> AsyncIterator[Tuple[str, bytes]]:
     """
-    Generating the audio for the story
-    will return a path to the audio
+    FAQ answer as audio: each sentence goes to TTS as soon as the model has
+    finished it, so the first sentence plays while the rest is generated.
+    Yields (sentence, mp3 bytes) in order.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("Missing OPENAI_API_KEY")
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-
-    data = {
-        "model": settings.OPENAI_MODEL_NAME_TTS,  # should be 'tts-1'
-        "input": story,
-        "voice": "alloy",  # options: alloy, echo, fable, onyx, nova, shimmer
-        "response_format": "mp3",
-    }
+    answers = None
+    query_embedding: List[float] = []
+    cached = qa_store.get_exact(prompt, scope=FAQ_SCOPE)
+    if cached is None and settings.RETRIEVAL_MODE == "fast":
+        answers = await asyncio.to_thread(decisive_faq_answers, prompt, 3)
+    if cached is None and answers is None:
+        query_embedding = await aembed_query(prompt)
+        cached = qa_store.get_answer(prompt, query_embedding, scope=FAQ_SCOPE)
+    if cached is not None:
+        sentences: AsyncIterator[str] = _iter_sentences(cached)
+    else:
+        if answers is None:
+            answers = await asyncio.to_thread(get_top_answers, prompt, 3, query_embedding)
+        sentences = stream_sentences(answers, user_query=prompt)  # type: ignore
+
+    # modelul scrie frazele intr-o coada, ca TTS-ul frazei 1 sa nu astepte fraza 2
+    queue: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(_produce_sentences(sentences, queue))
+    spoken: List[str] = []
+    pending: List[Tuple[str, asyncio.Task]] = []
+    next_item: Union[asyncio.Task, None] = asyncio.create_task(queue.get())
+    try:
+        while next_item is not None or pending:
+            waiting = {next_item} if next_item is not None else set()
+            if pending:
+                waiting.add(pending[0][1])
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            # mp3-urile gata pleaca imediat, in ordinea frazelor
+            while pending and pending[0][1].done():
+                sentence_done, task = pending.pop(0)
+                yield sentence_done, task.result()
+            if next_item is not None and next_item.done():
+                item = next_item.result()
+                if item is _END:
+                    next_item = None
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    spoken.append(item)
+                    pending.append((item, asyncio.create_task(synthesize_speech(item))))
+                    next_item = asyncio.create_task(queue.get())
+        if cached is None and spoken:
+            qa_store.save_qa(prompt, " ".join(spoken), query_embedding or None, scope=FAQ_SCOPE)
+    finally:
+        producer.cancel()
+        if next_item is not None:
+            next_item.cancel()
+        for _, task in pending:
+            task.cancel()
+
+
+_END = object()
+
+
+async def _produce_sentences(sentences: AsyncIterator[str], queue: asyncio.Queue) -> None:
+    "Feed the sentences into `queue`, then _END (or the error that stopped the model)"
+    try:
+        async for sentence in sentences:
+            queue.put_nowait(sentence)
+    except Exception as e:
+        queue.put_nowait(e)
+        return
+    queue.put_nowait(_END)
+
+
+async def _iter_sentences(text: str) -> AsyncIterator[str]:
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if sentence:
+            yield sentence
+
+
+async def synthesize_speech(text: str) -> bytes:
+    "Mp3 bytes of `text`, from the TTS cache or the OpenAI TTS endpoint"
+    return await tts_cache.speech_bytes(text)
 
-    logger.debug("Requesting TTS from OpenAI...")
 
-    response = requests.post(
-        "https://api.openai.com/v1/audio/speech", headers=headers, json=data
-    )
-
-    if response.status_code != 200:
-        logger.error(f"TTS API failed: {response.status_code} - {response.text}")
-        raise RuntimeError("Failed to generate TTS audio")
-
-    audio_path = Path("out/audio") / f"{uuid.uuid4().hex}.mp3"
-    audio_path.parent.mkdir(parents=True, exist_ok=True)
+async def generate_audio(story: str) -> str:
+    """
+    Generating the audio for the story
+    will return a path to the audio (shared by every request for the same text)
+    """
+    audio_path = await tts_cache.speech_path(story)
+    return str(audio_path.resolve())
 
-    with open(audio_path, "wb") as f:
-        f.write(response.content)
 
-    logger.success(f"Saved TTS audio to: {audio_path}")
-    directory = os.path.dirname(__file__)
-    audio_path = os.path.join(directory, audio_path)
-    return audio_path
+def _read_file(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
 
 
 async def generate_text_from_audio(path_audio: Path) -> str:
     "Here we just take the path of the audio and convert it to text"
-    client = OpenAI()
-    audio_file = open(path_audio, "rb")
+    content = await asyncio.to_thread(_read_file, path_audio)
+    text = await transcribe_audio(Path(path_audio).name, content)
 
-    transcription = client.audio.transcriptions.create(
-        model=settings.OPENAI_MODEL_NAME_STT, file=audio_file
-    )
-
-    logger.debug(
-        f"Generating audio from path: {path_audio} - text : {transcription.text}"
-    )
-    return transcription.text
+    logger.debug(f"Generating audio from path: {path_audio} - text : {text}")
+    return text
 
 
-# WARN: Do not touch chat gpt cooked
-def _normalize(s: str) -> str:
-    # Normalize Unicode, replace NBSP with space, collapse whitespace, lowercase
-    s = unicodedata.normalize("NFKC", s)
-    s = s.replace("\u00a0", " ")  # NBSP -> space
-    s = s.replace("\u200b", "")  # zero-width space
-    s = re.sub(r"\s+", " ", s)  # collapse all whitespace
-    return s.strip().lower()
+_stt_semaphore: Union[asyncio.Semaphore, None] = None
 
 
-def _flex_pattern(phrase: str) -> re.Pattern:
-    # Build regex that ignores arbitrary whitespace between words
-    # e.g. "Documents required to support a claim" ->
-    # r'\bDocuments\s+required\s+to\s+support\s+a\s+claim\b' (case-insensitive)
-    words = [re.escape(w) for w in phrase.split()]
-    regex = r"\b" + r"\s+".join(words) + r"\b"
-    return re.compile(regex, re.IGNORECASE)
+async def transcribe_audio(filename: str, content: bytes) -> str:
+    """
+    Transcribe an audio clip already in memory. The filename extension tells
+    the API the format; at most STT_MAX_CONCURRENCY clips are uploaded at once.
+    """
+    global _stt_semaphore
+    if _stt_semaphore is None:
+        _stt_semaphore = asyncio.Semaphore(settings.STT_MAX_CONCURRENCY)
+    async with _stt_semaphore:
+        return await providers.transcribe((filename, content))
 
 
 async def search_text_in_pdfs(
@@ -259,126 +428,112 @@ async def search_text_in_pdfs(
 ) -> Tuple[Union[Path, None], int]:
     """
     Returns (pdf_path, 1-based page_number) of the first page containing `text`,
-    using normalization + flexible whitespace matching. If not found, (None, -1).
+    looked up in the page store filled at ingest time. If not found, (None, -1).
     """
     # Use a short anchor (first ~8 words) to avoid over-specific matching
     anchor = " ".join((text or "").split()[:8]).strip()
     if not anchor:
         return None, -1
 
-    pattern = _flex_pattern(anchor)
-
-    for file in directory_pdfs.glob("*.pdf"):
-        try:
-            reader = PyPDF2.PdfReader(file)
-        except Exception:
-            continue
-        for page_number, page in enumerate(reader.pages, start=1):
-            try:
-                raw = page.extract_text() or ""
-            except Exception:
-                raw = ""
-            # Normalize *for a fallback contains check*
-            norm_page = _normalize(raw)
-            norm_anchor = _normalize(anchor)
-
-            # Fast path: normalized substring (handles NBSP/newlines)
-            if norm_anchor and norm_anchor in norm_page:
-                return file, page_number
-
-            # Slower path: flexible whitespace regex on the raw text
-            if pattern.search(raw):
-                return file, page_number
-
-    return None, -1
-
-
-async def check_if_user_wants_agent(text: str) -> str:
+    return page_store.find(anchor, under=directory_pdfs)
+
+
+Intent = Literal["form", "agent", "info"]
+
+# cereri explicite de formular / agent (en + ro, textul e fara diacritice); restul decide LLM-ul
+FORM_RE = re.compile(
+    r"\b(?:i\s+(?:want|wanna|need)|i\s+would\s+like|i'?d\s+like|please)\s+(?:to\s+)?"
+    r"(?:buy|purchase|apply\s+for|get\s+(?:a\s+)?quote|sign\s+up|"
+    r"(?:file|make|submit|open|start)\s+(?:a|an|my)?\s*(?:claim|policy|insurance))\b|"
+    r"\b(?:vreau|as\s+vrea|doresc)\s+(?:sa\s+)?(?:fac|cumpar|inchei|deschid|depun|primesc)\s+"
+    r"(?:o\s+)?(?:asigurare|polita|dauna|cotatie|oferta)\b",
+    flags=re.IGNORECASE,
+)
+AGENT_ASK_RE = re.compile(
+    r"\b(talk|speak|connect|transfer|put\s+me\s+through|vorbesc|vorbi|legatura|transferati)\b",
+    flags=re.IGNORECASE,
+)
+CALLBACK_RE = re.compile(
+    r"\b(call\s+me(?:\s+back)?|call\s+back|callback|suna-?\s*ma|sunati-?\s*ma|ma\s+sunati|ma\s+suna)\b",
+    flags=re.IGNORECASE,
+)
+HEDGE_RE = re.compile(
+    r"\?|\b(don'?t|do\s+not|not|never|should\s+i|do\s+i|need\s+to|if|"
+    r"nu|trebuie|oare|daca)\b",
+    flags=re.IGNORECASE,
+)
+
+
+def classify_intent_local(text: str) -> Union[Intent, None]:
     """
-    We take the text and use open ai's api to check if the user wants to get
-    if the user wants to talk to an agent
-    e.g. I want to talk to an agent
+    Rule tier in front of the LLM classifier. Returns an intent only when a
+    form or agent request is explicit; everything else (questions, hedges,
+    mixed or no keywords) goes to the model.
     """
-    system_template = (
-        "You are an intent classifier for ByteMe Insurance.\n"
-        "Task: Determine whether the customer is asking to talk to a human agent/representative (transfer to agent or request a callback).\n"
-        "Output a single short sentence (max 2). Keep numbers/years exactly as written.\n"
-        "If the input is Romanian, answer in Romanian; otherwise, answer in the input language.\n"
-        "Rules:\n"
-        "- Answer strictly as: 'YES — <very brief reason>' or 'NO — <very brief reason>'.\n"
-        "- Consider YES when the user explicitly asks to talk to a person (agent/operator/representative/consultant/human), "
-        "asks to be called back (e.g., 'call me', 'please call', 'sună-mă'), provides a phone number expecting contact, "
-        "or requests transfer/escalation to a human.\n"
-        "- Consider NO for generic info questions, requests to fill a form/submit a claim without asking for a person, "
-        "hypotheticals (e.g., 'do I need to talk to an agent?'), or when the user declines a transfer (e.g., 'don't transfer me').\n"
-        "- If both 'form' and 'agent' are mentioned, prefer YES (the user wants a human).\n"
-        "No preamble, no extra formatting."
-    )
-
-    user_template = (
-        "Customer message:\n{text}\n\n"
-        "Does the customer want to talk to a human agent now (transfer/callback)? Reply ONLY with 'YES — <reason>' or 'NO — <reason>'."
-    )
+    t = _strip_accents(text or "")
+    if HEDGE_RE.search(t):
+        return None
+    sms = SMS_RE.search(t)
+    human = HUMAN_RE.search(t)
+    form = FORM_RE.search(t)
+    ask = AGENT_ASK_RE.search(t)
+    callback = CALLBACK_RE.search(t)
+
+    agent = (human and ask) or callback
+    if agent and not (sms or form):
+        return "agent"
+    if form and not (sms or human or ask or callback):
+        return "form"
+    return None
+
+
+_INTENT_SYSTEM = (
+    "You are an intent classifier for ByteMe Insurance.\n"
+    "Task: classify the customer message into exactly one intent:\n"
+    "- 'agent': the customer explicitly asks to talk to a person (agent/operator/representative/consultant/human), "
+    "asks to be called back (e.g., 'call me', 'please call', 'sună-mă'), provides a phone number expecting contact, "
+    "or requests transfer/escalation to a human. If both a form and an agent are mentioned, prefer 'agent'.\n"
+    "- 'form': the customer wants to start, buy, apply for, make insurance, request a quote, or submit a claim.\n"
+    "- 'info': generic info questions, small talk, ambiguous statements, hypotheticals "
+    "(e.g., 'do I need to talk to an agent?') or when the user declines a transfer.\n"
+    "The message may be Romanian or English.\n"
+    'Reply ONLY with JSON: {{"intent": "form" | "agent" | "info", "reason": "<very brief reason>"}}'
+)
+
+_INTENT_RE = re.compile(r"\b(form|agent|info)\b", flags=re.IGNORECASE)
+
+def _build_intent_chain():
     prompt_tmpl = ChatPromptTemplate.from_messages(
         [
-            ("system", system_template),
-            ("human", user_template),
+            ("system", _INTENT_SYSTEM),
+            ("human", "Customer message:\n{text}"),
         ]
     )
-
-    model_text = ChatOpenAI(
-        model=settings.OPENAI_MODEL_NAME_TEXT,
-        temperature=0.2,
-        max_tokens=100,
-    )  # type: ignore
-
-    chain = prompt_tmpl | model_text | StrOutputParser()
-    extra: str = await chain.ainvoke({"text": text})
-    extra = (extra or "").strip()
-
-    return extra
+    return prompt_tmpl | providers.chat_model(temperature=0, max_tokens=60) | StrOutputParser()
 
 
-async def check_if_user_wants_form(text: str) -> str:
+async def classify_intent(text: str) -> Intent:
     """
-    We take the text and use open ai's api to check if the user wants to get
-    if the user wants to like a form
-    e.g. I want to make an insurance on your firm for my car
+    Single intent stage for /rsp_db: 'form', 'agent' or 'info'.
+    Confident cases are decided locally; the rest take one LLM call.
     """
-    system_template = (
-        "You are an intent classifier for ByteMe Insurance.\n"
-        "Task: Decide if the customer wants to complete a form (to start/buy/apply for an insurance policy or to submit a claim).\n"
-        "Output a single short sentence (max 2). Keep numbers/years exactly as written.\n"
-        "If the input is Romanian, answer in Romanian; otherwise, answer in the input language.\n"
-        "Rules:\n"
-        "- Answer strictly as: 'YES — <very brief reason>' or 'NO — <very brief reason>'.\n"
-        "- Consider YES when the user expresses desire to start, buy, apply for, make insurance, request a quote, or submit a claim.\n"
-        "- Consider NO for generic info questions, small talk, or ambiguous statements.\n"
-        "No preamble, no extra formatting."
-    )
-
-    user_template = (
-        "Customer message:\n{text}\n\n"
-        "Does the customer want to complete a form? Reply with 'YES — <reason>' or 'NO — <reason>'."
-    )
-    prompt_tmpl = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_template),
-            ("human", user_template),
-        ]
-    )
-
-    model_text = ChatOpenAI(
-        model=settings.OPENAI_MODEL_NAME_TEXT,
-        temperature=0.2,
-        max_tokens=100,
-    )  # type: ignore
-
-    chain = prompt_tmpl | model_text | StrOutputParser()
-    extra: str = await chain.ainvoke({"text": text})
-    extra = (extra or "").strip()
+    local = classify_intent_local(text)
+    if local is not None:
+        logger.debug(f"Intent decided locally : {local}")
+        return local
 
-    return extra
+    async with providers.limit():
+        raw: str = await providers.chain("intent", _build_intent_chain).ainvoke({"text": text})
+    raw = (raw or "").strip()
+    try:
+        intent = str(json.loads(raw).get("intent", "")).lower()
+    except (ValueError, AttributeError):
+        m = _INTENT_RE.search(raw)
+        intent = m.group(1).lower() if m else ""
+    if intent not in ("form", "agent", "info"):
+        intent = "info"
+    logger.debug(f"Intent from LLM : {intent} ({raw})")
+    return intent  # type: ignore
 
 
 async def generate_form(text: str) -> list[str]:
@@ -401,21 +556,17 @@ async def generate_form(text: str) -> list[str]:
         "Return ONLY the questions, one per line, in English."
     )
 
-    prompt_tmpl = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_template),
-            ("human", user_template),
-        ]
-    )
-
-    model_text = ChatOpenAI(
-        model=settings.OPENAI_MODEL_NAME_TEXT,
-        temperature=0.2,
-        max_tokens=200,
-    )  # type: ignore
+    def build():
+        prompt_tmpl = ChatPromptTemplate.from_messages(
+            [
+                ("system", system_template),
+                ("human", user_template),
+            ]
+        )
+        return prompt_tmpl | providers.chat_model(temperature=0.2, max_tokens=200) | StrOutputParser()
 
-    chain = prompt_tmpl | model_text | StrOutputParser()
-    raw: str = await chain.ainvoke({"text": text})
+    async with providers.limit():
+        raw: str = await providers.chain("form", build).ainvoke({"text": text})
     raw = (raw or "").strip()
 
     # transformă în listă de întrebări
@@ -5,14 +5,38 @@ from sqlalchemy.ext.mutable import MutableList
 from enum import Enum as PyEnum
 from sqlalchemy import Enum as SQLAEnum
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy import String, Text, ForeignKey, DateTime, Enum, Integer
+from sqlalchemy import String, Text, ForeignKey, DateTime, Enum, Integer, Index, event
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime, timezone
 import uuid
 
+from .config import settings
+from .migrations import run_migrations
+
 DATABASE_URL = "sqlite+aiosqlite:///./app.db"
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: cititorii (dashboard) nu mai blocheaza scrierile apelurilor
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA cache_size=-{settings.DB_CACHE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_BYTES}")
+    cursor.close()
+
+
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
@@ -33,14 +57,24 @@ class ConversationLabel(PyEnum):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_phone_number_started_at", "phone_number", "started_at"),
+        Index("ix_conversations_phone_e164_started_at", "phone_e164", "started_at", "id"),
+        Index("ix_conversations_started_at_id", "started_at", "id"),
+    )
     id: Mapped[str] = mapped_column(String, primary_key=True)  # uuid4 str
     phone_number: Mapped[Union[str, None]] = mapped_column(String, nullable=True)
+    # phone_number asa cum a fost spus, phone_e164 forma canonica (cheia de cautare)
+    phone_e164: Mapped[Union[str, None]] = mapped_column(String, nullable=True)
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     ended_at: Mapped[Union[datetime, None]] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
     messages = relationship(
-        "Message", back_populates="conversation", cascade="all, delete-orphan"
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="[Message.created_at, Message.id]",
     )
     label: Mapped[Optional[ConversationLabel]] = mapped_column(
         SQLAEnum(
@@ -60,6 +94,10 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+        Index("ix_messages_created_at", "created_at"),
+    )
     id: Mapped[str] = mapped_column(
         String, primary_key=True, default=lambda: str(uuid.uuid4())
     )
@@ -79,6 +117,11 @@ class Message(Base):
 
 class Form(Base):
     __tablename__ = "forms"
+    __table_args__ = (
+        Index("ix_forms_created_at", "created_at"),
+        Index("ix_forms_created_at_id", "created_at", "id"),
+        Index("ix_forms_conversation_id_created_at", "conversation_id", "created_at"),
+    )
 
     id: Mapped[str] = mapped_column(
         String, primary_key=True, default=lambda: str(uuid.uuid4())
@@ -99,3 +142,5 @@ class Form(Base):
 async def init_db_conversations():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # tabelele existente primesc indexurile / coloanele noi prin migrari
+    await run_migrations(engine)
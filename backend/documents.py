@@ -1,16 +1,18 @@
 # documents.py
+import asyncio
+import hashlib
 import os
 import uuid
 from pathlib import Path
 import sqlite3
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
 from loguru import logger
 
-# Re-use your existing Chroma ingestion function directly
-from .tmp_databases.query import add_pdfs  # same as in /populate_chroma
+# Chroma ingestion runs as a background job (same chunking as /populate_chroma)
+from .jobs import IngestJob, ingest_queue
 
 router = APIRouter()
 
@@ -38,22 +40,83 @@ def _init_doc_db():
                 deleted INTEGER DEFAULT 0
             )
         """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+        if "content_hash" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        if "tag" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN tag TEXT")
+        # NULL = indexat inainte sa urmarim starea
+        if "ingest_state" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN ingest_state TEXT")
+        if "job_id" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN job_id TEXT")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents(content_hash)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_documents_tag ON documents(tag)")
+
+
+def _backfill_hashes():
+    "Documents uploaded before deduplication get their content hash once"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        rows = conn.execute(
+            "SELECT id, path FROM documents WHERE content_hash IS NULL"
+        ).fetchall()
+        for doc_id, path in rows:
+            try:
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                continue
+            conn.execute(
+                "UPDATE documents SET content_hash = ? WHERE id = ?", (digest, doc_id)
+            )
+        conn.commit()
 
 
 _init_doc_db()
+_backfill_hashes()
 
 
-def _insert_document(name: str, path: str, collection: str) -> int:
+def _insert_document(
+    name: str,
+    path: str,
+    collection: str,
+    content_hash: Optional[str] = None,
+    tag: Optional[str] = None,
+) -> int:
     with sqlite3.connect(DOC_DB_PATH) as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO documents (name, path, collection, uploaded_at, deleted) VALUES (?, ?, ?, ?, 0)",
-            (name, path, collection, datetime.utcnow().isoformat() + "Z"),
+            "INSERT INTO documents (name, path, collection, uploaded_at, deleted, content_hash, tag, ingest_state) VALUES (?, ?, ?, ?, 0, ?, ?, 'pending')",
+            (name, path, collection, datetime.utcnow().isoformat() + "Z", content_hash, tag),
         )
         conn.commit()
         return cur.lastrowid
 
 
+def _find_document(column: str, value: Union[str, int]) -> Optional[dict]:
+    "Latest non-deleted document whose `column` (id / content_hash) equals `value`"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            f"SELECT * FROM documents WHERE {column} = ? AND deleted = 0 ORDER BY id DESC LIMIT 1",
+            (value,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def _update_revision(doc_id: int, content_hash: str, tag: Optional[str] = None) -> dict:
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            "UPDATE documents SET content_hash = ?, uploaded_at = ?, tag = COALESCE(?, tag), ingest_state = 'pending' WHERE id = ?",
+            (content_hash, datetime.utcnow().isoformat() + "Z", tag, doc_id),
+        )
+        conn.commit()
+        return dict(conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone())
+
+
 def _fetch_documents(include_deleted: bool = False, limit: Optional[int] = None):
     with sqlite3.connect(DOC_DB_PATH) as conn:
         conn.row_factory = sqlite3.Row
@@ -69,15 +132,194 @@ def _fetch_documents(include_deleted: bool = False, limit: Optional[int] = None)
         return [dict(r) for r in rows]
 
 
-@router.post("/upload_and_index")
-async def upload_and_index(file: UploadFile = File(...)):
+def collections_for_tag(tag: str) -> list[str]:
+    "Collections of every non-deleted document uploaded with `tag` (tenant, customer, ...)"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT collection FROM documents WHERE tag = ? AND deleted = 0",
+            (tag,),
+        ).fetchall()
+        return [r[0] for r in rows]
+
+
+def _mark_deleted(doc_id: int, linked: bool = False) -> None:
+    "With `linked`, the rows of the same file linked to other tags go too"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        if linked:
+            conn.execute(
+                """
+                UPDATE documents SET deleted = 1
+                WHERE collection = (SELECT collection FROM documents WHERE id = ?)
+                  AND path = (SELECT path FROM documents WHERE id = ?)
+                """,
+                (doc_id, doc_id),
+            )
+        else:
+            conn.execute("UPDATE documents SET deleted = 1 WHERE id = ?", (doc_id,))
+        conn.commit()
+
+
+def _has_tag(content_hash: str, tag: str) -> bool:
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        row = conn.execute(
+            "SELECT 1 FROM documents WHERE content_hash = ? AND tag = ? AND deleted = 0 LIMIT 1",
+            (content_hash, tag),
+        ).fetchone()
+        return row is not None
+
+
+def _link_tag(doc: dict, tag: str) -> dict:
+    "New row for `tag` sharing the document's file, collection and ingest job"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        cur = conn.execute(
+            """
+            INSERT INTO documents (name, path, collection, uploaded_at, deleted, content_hash, tag, ingest_state, job_id)
+            VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)
+            """,
+            (
+                doc["name"],
+                doc["path"],
+                doc["collection"],
+                datetime.utcnow().isoformat() + "Z",
+                doc["content_hash"],
+                tag,
+                doc.get("ingest_state"),
+                doc.get("job_id"),
+            ),
+        )
+        conn.commit()
+        return dict(conn.execute("SELECT * FROM documents WHERE id = ?", (cur.lastrowid,)).fetchone())
+
+
+def _set_ingest_state(doc_id: int, state: str) -> None:
+    "pending (queued or running) -> indexed | failed, also for the rows linked to other tags"
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.execute(
+            """
+            UPDATE documents SET ingest_state = ?
+            WHERE collection = (SELECT collection FROM documents WHERE id = ?)
+              AND path = (SELECT path FROM documents WHERE id = ?)
+            """,
+            (state, doc_id, doc_id),
+        )
+        conn.commit()
+
+
+def _set_job_id(doc_id: int, job_id: str) -> None:
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.execute("UPDATE documents SET job_id = ? WHERE id = ?", (job_id, doc_id))
+        conn.commit()
+
+
+def _pending_documents() -> list[dict]:
+    with sqlite3.connect(DOC_DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT * FROM documents WHERE ingest_state = 'pending' AND deleted = 0 ORDER BY id"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+async def _submit_ingest(
+    doc_id: int, path: str, collection: str, replace: bool, drop_on_failure: bool
+) -> IngestJob:
+    """
+    Queue the indexing of a document and track it in documents.db, so an
+    upload interrupted by a restart is picked up again at startup.
+    """
+
+    async def on_done(job: IngestJob) -> None:
+        await asyncio.to_thread(_set_ingest_state, doc_id, "indexed")
+
+    async def on_failed(job: IngestJob) -> None:
+        if drop_on_failure:
+            # un document neindexat nu trebuie oferit pentru intrebari (nici sub alte tag-uri)
+            await asyncio.to_thread(_mark_deleted, doc_id, True)
+        await asyncio.to_thread(_set_ingest_state, doc_id, "failed")
+
+    job = ingest_queue.submit(path, collection, on_done=on_done, on_failed=on_failed, replace=replace)
+    await asyncio.to_thread(_set_job_id, doc_id, job.id)
+    return job
+
+
+async def requeue_pending_documents() -> int:
+    """
+    Startup: documents whose indexing never finished (the process stopped while
+    they were queued or embedding) are queued again. Chunks already in the
+    collection are reused, so only the missing ones get embedded.
+    """
+    docs = await asyncio.to_thread(_pending_documents)
+    for doc in docs:
+        if not os.path.exists(doc["path"]):
+            logger.warning(f"Document {doc['id']} lost its file {doc['path']}, marked deleted")
+            await asyncio.to_thread(_mark_deleted, doc["id"])
+            continue
+        await _submit_ingest(doc["id"], doc["path"], doc["collection"], True, True)
+    if docs:
+        logger.info(f"Re-queued {len(docs)} documents whose indexing was interrupted")
+    return len(docs)
+
+
+def _document_stage(doc: dict) -> str:
+    "Stage of the document's last ingest job, also once the job left memory"
+    job = ingest_queue.get(doc["job_id"]) if doc.get("job_id") else None
+    if job is not None:
+        return job.stage
+    return {"pending": "queued", "failed": "failed"}.get(doc.get("ingest_state") or "", "done")
+
+
+def _write_upload(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+@router.post("/upload_and_index", status_code=202)
+async def upload_and_index(
+    file: UploadFile = File(...),
+    tag: Optional[str] = Form(None),
+    replaces: Optional[int] = Form(None),
+):
     """
     Accepts a PDF file from the frontend, saves it to tmp_databases/,
-    indexes it into a new Chroma collection (docs_<uuid>), and stores metadata.
+    stores its metadata and queues the indexing into a Chroma collection.
+    Returns right away; poll /jobs/{job_id} for progress.
+
+    - the same bytes uploaded again map to the existing document (no job);
+      under a new `tag` they are linked to it (same collection)
+    - `replaces` (a document id) uploads a new revision of that document: it
+      reuses its collection and only the chunks whose text changed are embedded
+    - anything else gets a fresh docs_<uuid> collection
+
+    `tag` groups documents (e.g. all policies of one customer) so /q_multi
+    can search them together.
     """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
+    content = await file.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    duplicate = await asyncio.to_thread(_find_document, "content_hash", content_hash)
+    if duplicate is not None:
+        logger.info(f"{file.filename} is identical to document {duplicate['id']}, not re-indexed")
+        if tag is not None and not await asyncio.to_thread(_has_tag, content_hash, tag):
+            # acelasi pdf pentru alt client: il legam de tag, fara re-indexare
+            duplicate = await asyncio.to_thread(_link_tag, duplicate, tag)
+        return {**duplicate, "stage": _document_stage(duplicate), "duplicate": True}
+
+    if replaces is not None:
+        previous = await asyncio.to_thread(_find_document, "id", replaces)
+        if previous is None:
+            raise HTTPException(status_code=404, detail=f"Unknown document {replaces}")
+        # revizie: suprascriem fisierul si pastram colectia
+        save_path = previous["path"]
+        await asyncio.to_thread(_write_upload, save_path, content)
+        doc = await asyncio.to_thread(_update_revision, previous["id"], content_hash, tag)
+        logger.info(f"Saved new revision of {file.filename} to {save_path}")
+        job = await _submit_ingest(doc["id"], save_path, doc["collection"], True, False)
+        return {**doc, "job_id": job.id, "stage": job.stage, "duplicate": False}
+
     # Save to tmp_databases/
     save_path = os.path.join(UPLOAD_DIR, file.filename)
     if os.path.exists(save_path):
@@ -86,23 +328,21 @@ async def upload_and_index(file: UploadFile = File(...)):
             UPLOAD_DIR, f"{name}_{int(datetime.now().timestamp())}{ext}"
         )
 
-    content = await file.read()
-    with open(save_path, "wb") as f:
-        f.write(content)
+    await asyncio.to_thread(_write_upload, save_path, content)
     logger.info(f"Saved PDF to {save_path}")
 
-    # Create a fresh collection and add the PDF (same behavior as /populate_chroma)
+    # Store metadata we can query later
     collection_name = f"docs_{uuid.uuid4()}"
-    try:
-        add_pdfs([save_path], collection_name)
-    except Exception as e:
-        logger.exception("Failed to add PDFs to Chroma")
-        raise HTTPException(
-            status_code=500, detail=f"Chroma ingestion failed: {str(e)}"
-        )
+    doc_id = await asyncio.to_thread(
+        _insert_document,
+        os.path.basename(save_path),
+        save_path,
+        collection_name,
+        content_hash,
+        tag,
+    )
 
-    # Store metadata we can query later
-    doc_id = _insert_document(os.path.basename(save_path), save_path, collection_name)
+    job = await _submit_ingest(doc_id, save_path, collection_name, False, True)
 
     return {
         "id": doc_id,
@@ -111,9 +351,26 @@ async def upload_and_index(file: UploadFile = File(...)):
         "collection": collection_name,
         "uploaded_at": datetime.utcnow().isoformat() + "Z",
         "deleted": 0,
+        "content_hash": content_hash,
+        "tag": tag,
+        "ingest_state": "pending",
+        "job_id": job.id,
+        "stage": job.stage,
+        "duplicate": False,
     }
 
 
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str) -> IngestJob:
+    """
+    Progress of an ingestion job: stage, pages, chunk counts and throughput.
+    """
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+
 @router.get("/documents")
 def list_documents(include_deleted: bool = Query(False)):
     """
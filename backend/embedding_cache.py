@@ -0,0 +1,171 @@
+# embedding_cache.py - content-addressed cache for query embeddings
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from .config import settings
+from .embeddings import embedding_backend
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class EmbeddingCache:
+    """
+    Two tiers keyed by sha256(backend id, normalized text):
+      - an in-process LRU of the hottest vectors
+      - a persistent SQLite table, trimmed by last use once it exceeds max_rows
+    """
+
+    def __init__(self, db_path: str, memory_items: int, max_rows: int) -> None:
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _init_db(self) -> None:
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings(last_used);
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{_normalize(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._conn.execute(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self._remember(key, vector)
+            return vector
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> np.ndarray:
+        key = self.key(model, text)
+        arr = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                """
+                INSERT INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    model = excluded.model, vector = excluded.vector, last_used = excluded.last_used
+                """,
+                (key, model, arr.tobytes(), time.time()),
+            )
+            # doar randurile noi conteaza, rescrierea unei chei nu creste tabelul
+            if exists is None:
+                self._rows += 1
+            self._evict()
+            self._conn.commit()
+            self._remember(key, arr)
+        return arr
+
+    def _evict(self) -> None:
+        if self._rows <= self.max_rows:
+            return
+        # taiem la 90% ca sa nu stergem la fiecare insert
+        target = int(self.max_rows * 0.9)
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (self._rows - target,),
+        )
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.debug(f"Embedding cache evicted down to {self._rows} rows")
+
+    def get_or_compute(
+        self,
+        model: str,
+        texts: Sequence[str],
+        compute: Callable[[list[str]], Sequence[Sequence[float]]],
+    ) -> list[np.ndarray]:
+        "Return one vector per text, embedding only the misses in a single batch"
+        vectors: list[Optional[np.ndarray]] = [self.get(model, t) for t in texts]
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            computed = compute([texts[i] for i in misses])
+            for i, vector in zip(misses, computed):
+                vectors[i] = self.put(model, texts[i], vector)
+        return vectors  # type: ignore
+
+    async def aget_or_compute(
+        self,
+        model: str,
+        texts: Sequence[str],
+        compute: Callable[[list[str]], Awaitable[Sequence[Sequence[float]]]],
+    ) -> list[np.ndarray]:
+        "Async twin of get_or_compute, the misses are embedded without blocking the loop"
+        vectors: list[Optional[np.ndarray]] = [self.get(model, t) for t in texts]
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            computed = await compute([texts[i] for i in misses])
+            for i, vector in zip(misses, computed):
+                vectors[i] = self.put(model, texts[i], vector)
+        return vectors  # type: ignore
+
+
+embedding_cache = EmbeddingCache(
+    db_path=settings.EMBEDDING_CACHE_PATH,
+    memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+    max_rows=settings.EMBEDDING_CACHE_MAX_ROWS,
+)
+
+
+def embed_query(text: str) -> list[float]:
+    "Embedding of a single query, served from the cache when it was seen before"
+    backend = embedding_backend()
+    (vector,) = embedding_cache.get_or_compute(backend.id, [text], backend.embed)
+    return vector.tolist()
+
+
+async def aembed_query(text: str) -> list[float]:
+    backend = embedding_backend()
+    (vector,) = await embedding_cache.aget_or_compute(backend.id, [text], backend.aembed)
+    return vector.tolist()
@@ -0,0 +1,148 @@
+# embeddings.py - pluggable embedding backends (OpenAI or local CPU)
+import asyncio
+import re
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from typing import Sequence, Union
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+
+from . import providers
+from .config import settings
+
+
+class EmbeddingBackend(ABC):
+    """
+    Turns texts into vectors. `id` names the backend and its model; it is
+    recorded on every collection the backend builds and keys the embedding
+    cache, so vectors of different backends never get mixed.
+    """
+
+    id: str
+    batch_size: int = 256
+
+    @abstractmethod
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]: ...
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        texts = list(texts)
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[i : i + self.batch_size]))
+        return vectors
+
+    async def aembed(self, texts: Sequence[str]) -> list[list[float]]:
+        # backend-urile locale consuma CPU, nu au ce cauta pe event loop
+        return await asyncio.to_thread(self.embed, texts)
+
+    @abstractmethod
+    def chroma_function(self) -> EmbeddingFunction:
+        "Embedding function handed to Chroma when a collection is opened"
+
+
+class OpenAIBackend(EmbeddingBackend):
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.id = f"openai:{model}"
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return providers.embed_texts(texts)
+
+    async def aembed(self, texts: Sequence[str]) -> list[list[float]]:
+        texts = list(texts)
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(providers.aembed_texts(b) for b in batches))
+        return [v for batch in results for v in batch]
+
+    def chroma_function(self) -> EmbeddingFunction:
+        return embedding_functions.OpenAIEmbeddingFunction(
+            api_key=settings.OPENAI_API_KEY, model_name=self.model
+        )
+
+
+class OnnxBackend(EmbeddingBackend):
+    "all-MiniLM-L6-v2 on onnxruntime (Chroma's default model), 384 dims, CPU only"
+
+    batch_size = 64
+
+    def __init__(self) -> None:
+        self.id = "onnx:all-MiniLM-L6-v2"
+        self._function = embedding_functions.DefaultEmbeddingFunction()
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [np.asarray(v, dtype=np.float32).tolist() for v in self._function(texts)]  # type: ignore
+
+    def chroma_function(self) -> EmbeddingFunction:
+        return self._function  # type: ignore
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Signed feature hashing of words and character trigrams into `dimension`
+    buckets, log-scaled and L2-normalized. No model and no download: lexical
+    similarity only, but deterministic and fast enough for any batch.
+    """
+
+    batch_size = 1024
+
+    def __init__(self, dimension: int) -> None:
+        self.dimension = dimension
+        self.id = f"hashing:{dimension}"
+
+    @staticmethod
+    def _features(text: str) -> list[str]:
+        text = unicodedata.normalize("NFKC", text or "").casefold()
+        words = _TOKEN_RE.findall(text)
+        grams = [f"#{w[i:i + 3]}" for w in words for i in range(max(1, len(w) - 2))]
+        return words + grams
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dimension)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix.tolist()
+
+    def chroma_function(self) -> EmbeddingFunction:
+        return _ChromaAdapter(self)
+
+
+class _ChromaAdapter(EmbeddingFunction):
+    def __init__(self, backend: EmbeddingBackend) -> None:
+        self.backend = backend
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.backend.embed(list(input))  # type: ignore
+
+
+_backend: Union[EmbeddingBackend, None] = None
+
+
+def embedding_backend() -> EmbeddingBackend:
+    "The backend chosen by settings.EMBEDDING_BACKEND (openai | onnx | hashing)"
+    global _backend
+    if _backend is None:
+        name = settings.EMBEDDING_BACKEND
+        if name == "openai":
+            _backend = OpenAIBackend(settings.OPENAI_MODEL_NAME_EMBEDDING)
+        elif name == "onnx":
+            _backend = OnnxBackend()
+        elif name == "hashing":
+            _backend = HashingBackend(settings.LOCAL_EMBEDDING_DIM)
+        else:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r}")
+    return _backend
@@ -0,0 +1,165 @@
+# jobs.py - background ingestion of uploaded pdfs
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Union
+
+from loguru import logger
+from pydantic import BaseModel, computed_field
+
+from .config import settings
+from .tmp_databases.cache import qa_store
+from .chroma_registry import chroma
+from .tmp_databases.query import add_chunks, load_pdf_chunks, remove_stale_chunks, reset_collection
+
+EMBED_BATCH = 64
+
+
+class IngestJob(BaseModel):
+    id: str
+    path: str
+    collection: str
+    stage: str = "queued"  # queued -> parsing -> embedding -> done | failed
+    pages: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    chunks_removed: int = 0
+    replace: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def chunks_per_second(self) -> Union[float, None]:
+        processed = self.chunks_embedded + self.chunks_reused
+        if self.started_at is None or not processed:
+            return None
+        end = self.finished_at or datetime.now(timezone.utc)
+        elapsed = (end - self.started_at).total_seconds()
+        return round(processed / elapsed, 2) if elapsed > 0 else None
+
+
+JobCallback = Callable[[IngestJob], Awaitable[None]]
+
+
+class IngestQueue:
+    """
+    Uploads are queued and parsed/embedded by a few workers in threads, so a
+    large pdf never runs on the event loop. The jobs stay queryable by id
+    (the most recent `keep` of them).
+    """
+
+    def __init__(self, workers: int, keep: int = 500) -> None:
+        self.workers = workers
+        self.keep = keep
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._callbacks: dict[str, tuple[Optional[JobCallback], Optional[JobCallback]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingest-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(
+        self,
+        path: str,
+        collection: str,
+        on_done: Optional[JobCallback] = None,
+        on_failed: Optional[JobCallback] = None,
+        replace: bool = False,
+    ) -> IngestJob:
+        """
+        Queue `path` for `collection`. With `replace` the file is a new
+        revision of one already in the collection: its stale chunks are
+        removed once the new ones are in.
+        """
+        if self._queue is None:
+            raise RuntimeError("Ingestion queue is not started")
+        job = IngestJob(
+            id=str(uuid.uuid4()),
+            path=path,
+            collection=collection,
+            replace=replace,
+            created_at=datetime.now(timezone.utc),
+        )
+        self._jobs[job.id] = job
+        self._callbacks[job.id] = (on_done, on_failed)
+        while len(self._jobs) > self.keep:
+            old_id, _ = self._jobs.popitem(last=False)
+            self._callbacks.pop(old_id, None)
+        self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestJob) -> None:
+        on_done, on_failed = self._callbacks.pop(job.id, (None, None))
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            if job.replace and await asyncio.to_thread(chroma.is_stale, job.collection):
+                # re-ingest dupa schimbarea backend-ului de embeddings
+                await asyncio.to_thread(reset_collection, job.collection)
+            job.stage = "parsing"
+            job.pages, chunks = await asyncio.to_thread(load_pdf_chunks, job.path)
+            job.chunks_total = len(chunks)
+
+            job.stage = "embedding"
+            kept: set[str] = set()
+            for i in range(0, len(chunks), EMBED_BATCH):
+                batch = chunks[i : i + EMBED_BATCH]
+                ids, embedded = await asyncio.to_thread(add_chunks, batch, job.collection)
+                kept.update(ids)
+                job.chunks_embedded += embedded
+                job.chunks_reused += len(batch) - embedded
+
+            if job.replace:
+                job.chunks_removed = await asyncio.to_thread(
+                    remove_stale_chunks, job.collection, job.path, kept
+                )
+
+            qa_store.invalidate(job.collection)
+            job.stage = "done"
+            job.finished_at = datetime.now(timezone.utc)
+            logger.info(
+                f"Ingested {job.path} into {job.collection}: {job.chunks_total} chunks, "
+                f"{job.chunks_embedded} embedded, {job.chunks_reused} reused, "
+                f"{job.chunks_removed} removed ({job.chunks_per_second} chunks/s)"
+            )
+            if on_done is not None:
+                await on_done(job)
+        except Exception as e:
+            job.stage = "failed"
+            job.error = str(e)
+            job.finished_at = datetime.now(timezone.utc)
+            logger.exception(f"Ingestion job {job.id} for {job.path} failed")
+            if on_failed is not None:
+                await on_failed(job)
+
+
+ingest_queue = IngestQueue(workers=settings.INGEST_WORKERS)
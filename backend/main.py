@@ -1,12 +1,16 @@
 # main.py
+import asyncio
+import base64
+import json
 from contextlib import asynccontextmanager
-import re
-from typing import Union
+from typing import Any, AsyncIterator, Union
 from fastapi import Query
 import uuid
+from datetime import datetime
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware  # <<< ADDED
 
 from loguru import logger
@@ -17,23 +21,27 @@ from .models import (
     PathResponse,
     PdfsRequest,
     QueryRequest,
+    MultiQueryRequest,
+    TranscriptionItem,
 )
 
-from .populate import populate_db
 from .core_functions import (
     final_response,
     generate_audio,
     generate_text_from_audio,
     final_response_gpt,
     search_text_in_pdfs,
-    check_if_user_wants_form,
-    check_if_user_wants_agent,
+    classify_intent,
     generate_form,
+    stream_answer_audio,
+    transcribe_audio,
 )
-from .tmp_databases.query import add_pdfs, query_db, populate_db_tmp
+from .tmp_databases.query import add_pdfs, query_db, query_many
+from .seeding import run_seeding
 from .repo import (
     start_new_conversation,
-    append_message,
+    append_turn,
+    set_message_citation,
     close_conversation,
     extract_phone,
     get_conversations_with_messages_by_phone,
@@ -41,11 +49,20 @@ from .repo import (
     create_form,
     list_forms,
     form_to_dict,
+    stream_conversations,
+    stream_forms,
 )
-from .database import init_db_conversations, MessageRole
+from .database import init_db_conversations
+from .pipeline import Pipeline
+from . import providers
+from .config import settings
+from .jobs import ingest_queue
+from .message_buffer import message_buffer
+from .sessions import call_sessions
 
 # >>> ADDED: import our new router
 from .documents import router as documents_router  # <<< ADDED
+from .documents import collections_for_tag, requeue_pending_documents
 
 
 BASE_URL = ""
@@ -55,20 +72,25 @@ BASE_URL = ""
 async def lifespan(app: FastAPI):
     await init_db_conversations()
 
-    # Seed Q/A collection (skip on error so startup continues)
-    try:
-        populate_db(path=str(Path(__file__).with_name("db.json")))
-    except Exception as e:
-        logger.warning(f"populate_db skipped due to error: {e}")  # <<< ADDED
+    # Seeding re-embeds only when db.json / Insurance.pdf / the model changed
+    if settings.SEED_IN_BACKGROUND:
+        app.state.seeding = asyncio.create_task(run_seeding())
+    else:
+        await run_seeding()
 
-    # Seed tmp pdfs into chroma (skip on error so startup continues)
-    try:
-        populate_db_tmp()  # may call embeddings; guard it
-    except Exception as e:
-        logger.warning(f"populate_db_tmp skipped due to error: {e}")  # <<< ADDED
+    await ingest_queue.start()
+    # uploadurile intrerupte de oprire se indexeaza din nou
+    await requeue_pending_documents()
+    await message_buffer.start()
 
     app.state.conversation_id = await start_new_conversation(str(uuid.uuid4()))
     yield
+    await ingest_queue.stop()
+    # mesajele / formularele raspunsurilor deja trimise trebuie sa ajunga in db
+    await rsp_db_pipeline.drain()
+    # ultimele mesaje din buffer se scriu inainte de oprire
+    await message_buffer.stop()
+    await providers.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -83,12 +105,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # >>> ADDED: register the router (prefix left empty on purpose)
 app.include_router(documents_router)  # <<< ADDED
 
 
+async def conversation_for(call_sid: Union[str, None]) -> str:
+    """
+    Conversation of the call `call_sid`; requests without one (tests, the
+    dashboard) share the process-wide conversation as before.
+    """
+    if call_sid:
+        return await call_sessions.conversation(call_sid)
+    return app.state.conversation_id
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -103,11 +136,46 @@ async def response_from_llm(request: TextRequest) -> TextResponse:
     reply = await final_response(request.text)
     logger.debug(f"Generated reply text: {reply}")
     # we add to the db
-    await append_message(app.state.conversation_id, MessageRole.user, request.text)
-    await append_message(app.state.conversation_id, MessageRole.bot, reply)
+    conversation_id = await conversation_for(request.call_sid)
+    await append_turn(conversation_id, request.text, reply, durable=request.call_sid is not None)
     return TextResponse(text=reply)
 
 
+# POST : http://127.0.0.1:8000/rsp_audio?format=mp3
+# {
+#   "text": "How can I file an insurance claim?"
+# }
+@app.post("/rsp_audio")
+async def response_audio_stream(
+    request: TextRequest,
+    fmt: str = Query("mp3", alias="format", pattern="^(mp3|sse)$"),
+) -> StreamingResponse:
+    """
+    Streams the spoken FAQ answer sentence by sentence: raw mp3 over chunked
+    transfer (format=mp3) or SSE events with the sentence and base64 mp3.
+    """
+    conversation_id = await conversation_for(request.call_sid)
+
+    async def body() -> AsyncIterator[bytes]:
+        spoken: list[str] = []
+        async for sentence, audio in stream_answer_audio(request.text):
+            spoken.append(sentence)
+            if fmt == "sse":
+                event = {"text": sentence, "audio": base64.b64encode(audio).decode()}
+                yield f"data: {json.dumps(event)}\n\n".encode()
+            else:
+                yield audio
+        if fmt == "sse":
+            yield b"event: end\ndata: {}\n\n"
+
+        reply = " ".join(spoken)
+        logger.debug(f"Streamed reply text: {reply}")
+        await append_turn(conversation_id, request.text, reply, durable=request.call_sid is not None)
+
+    media_type = "text/event-stream" if fmt == "sse" else "audio/mpeg"
+    return StreamingResponse(body(), media_type=media_type)
+
+
 #  POST : http://127.0.0.1:8000/tts
 # {
 #   "text": "How can I file an insurance claim?"
@@ -136,6 +204,79 @@ async def speech_to_text(request: PathRequest) -> TextResponse:
     return TextResponse(text=text)
 
 
+AUDIO_EXTENSIONS = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+    "audio/mp4": "m4a",
+    "audio/x-m4a": "m4a",
+    "audio/flac": "flac",
+}
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    content = await file.read(settings.STT_MAX_UPLOAD_BYTES + 1)
+    if len(content) > settings.STT_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"{file.filename} is too large")
+    return content
+
+
+# POST: http://127.0.0.1:8000/speech/upload  (multipart, field "file")
+@app.post("/speech/upload")
+async def speech_upload(file: UploadFile = File(...)) -> TextResponse:
+    content = await _read_upload(file)
+    text = await transcribe_audio(file.filename or "audio.mp3", content)
+    logger.debug(f"Transcribed upload {file.filename}, text: {text}")
+    return TextResponse(text=text)
+
+
+# POST: http://127.0.0.1:8000/speech/stream  (raw audio body, Content-Type: audio/mpeg)
+@app.post("/speech/stream")
+async def speech_stream(request: Request) -> TextResponse:
+    """
+    The clip is read as it arrives in the request body (chunked uploads work),
+    no temporary file and no server-side path needed.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    extension = AUDIO_EXTENSIONS.get(content_type)
+    if extension is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported audio type {content_type!r}")
+
+    chunks: list[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.STT_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Audio clip is too large")
+        chunks.append(chunk)
+
+    text = await transcribe_audio(f"audio.{extension}", b"".join(chunks))
+    logger.debug(f"Transcribed streamed clip ({size} bytes), text: {text}")
+    return TextResponse(text=text)
+
+
+# POST: http://127.0.0.1:8000/speech/batch  (multipart, repeated field "files")
+@app.post("/speech/batch")
+async def speech_batch(files: list[UploadFile] = File(...)) -> list[TranscriptionItem]:
+    "Every clip is transcribed concurrently (bounded by STT_MAX_CONCURRENCY)"
+
+    async def one(file: UploadFile) -> TranscriptionItem:
+        name = file.filename or "audio.mp3"
+        try:
+            text = await transcribe_audio(name, await _read_upload(file))
+            return TranscriptionItem(filename=name, text=text)
+        except HTTPException as e:
+            return TranscriptionItem(filename=name, error=str(e.detail))
+        except Exception as e:
+            logger.warning(f"Transcription of {name} failed: {e}")
+            return TranscriptionItem(filename=name, error=str(e))
+
+    return list(await asyncio.gather(*(one(f) for f in files)))
+
+
 # POST http://127.0.0.1:8000/populate_chroma
 # {
 #   "paths": ["/home/alex/projects/hackaton_endava/backend/tmp_databases/Insurance.pdf"]
@@ -160,12 +301,164 @@ async def populate_chroma(request: PdfsRequest) -> TextResponse:
 @app.post("/q_db")
 async def q_db(request: QueryRequest):
     try:
-        docs = query_db(request.text, request.collection_name, request.k)
+        docs = await asyncio.to_thread(
+            query_db, request.text, request.collection_name, request.k, mode=request.mode
+        )
         return {"matches": docs}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# POST http://127.0.0.1:8000/q_multi
+# {
+#   "text": "What does my policy cover abroad?",
+#   "tag": "customer-0723",
+#   "k": 4
+# }
+@app.post("/q_multi")
+async def q_multi(request: MultiQueryRequest):
+    """
+    Search several collections (`collection_names` and/or every document
+    uploaded with `tag`) and return one merged top k.
+    """
+    collections = list(request.collection_names)
+    if request.tag:
+        collections += await asyncio.to_thread(collections_for_tag, request.tag)
+    if not collections:
+        raise HTTPException(status_code=404, detail="No collections for this request")
+    try:
+        docs = await query_many(request.text, collections, request.k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"matches": docs, "collections": list(dict.fromkeys(collections))}
+
+
+async def citation_from_hits(
+    hits: list[dict[str, Any]],
+) -> tuple[Union[str, None], Union[int, None]]:
+    """
+    The top hit already knows its pdf and page from the chunk metadata; only
+    chunks indexed without metadata fall back to the page store lookup.
+    """
+    if not hits:
+        return None, None
+    top = hits[0]
+    if top.get("source"):
+        return top["source"], top.get("page")
+    path_pdf, number_page = await search_text_in_pdfs(
+        Path("./tmp_databases/"), top["text"]
+    )
+    return (str(path_pdf), number_page) if path_pdf else (None, None)
+
+
+rsp_db_pipeline = Pipeline("rsp_db")
+
+
+@rsp_db_pipeline.stage("intent", deps=("request",))
+async def _intent_stage(request: QueryRequest) -> str:
+    return await classify_intent(request.text)
+
+
+# retrieval nu depinde de intent, pornesc in paralel
+@rsp_db_pipeline.stage("hits", deps=("request",))
+async def _hits_stage(request: QueryRequest) -> Union[list[dict[str, Any]], Exception]:
+    """
+    A failed retrieval is returned, not raised: agent turns don't use the hits
+    and must be answered even when the collection is missing.
+    """
+    try:
+        return await asyncio.to_thread(
+            query_db, request.text, request.collection_name, request.k, mode=request.mode
+        )  # type: ignore
+    except Exception as e:
+        logger.warning(f"Retrieval failed for {request.collection_name}: {e}")
+        return e
+
+
+@rsp_db_pipeline.stage("answer", deps=("request", "intent", "hits"))
+async def _answer_stage(
+    request: QueryRequest, intent: str, hits: Union[list[dict[str, Any]], Exception]
+) -> Union[str, None]:
+    if intent == "agent":
+        return None
+    if isinstance(hits, Exception):
+        raise hits
+    mode = request.mode or settings.RETRIEVAL_MODE
+    return await final_response_gpt(
+        request.text, hits, scope=request.collection_name, semantic=mode != "fast"  # type: ignore
+    )
+
+
+@rsp_db_pipeline.stage("citation", deps=("intent", "hits"), background=True)
+async def _citation_stage(
+    intent: str, hits: Union[list[dict[str, Any]], Exception]
+) -> tuple[Union[str, None], Union[int, None]]:
+    if intent != "info" or isinstance(hits, Exception):
+        return None, None
+    return await citation_from_hits(hits)
+
+
+@rsp_db_pipeline.stage(
+    "persist",
+    deps=("request", "conversation_id", "intent", "answer"),
+    background=True,
+)
+async def _persist_stage(
+    request: QueryRequest,
+    conversation_id: str,
+    intent: str,
+    answer: Union[str, None],
+) -> str:
+    "Save the turn without waiting for the citation; returns the reply's message id"
+    if intent == "form":
+        reply = f"sms sent for your personalized form on your query {answer}"
+    elif intent == "agent":
+        reply = "Called an agent"
+    else:
+        reply = answer  # type: ignore
+    # turele unui apel se scriu imediat, intr-o tranzactie: apelul poate fi inchis de alt worker
+    return await append_turn(
+        conversation_id, request.text, reply, durable=request.call_sid is not None
+    )
+
+
+@rsp_db_pipeline.stage("cite", deps=("persist", "citation"), background=True)
+async def _cite_stage(
+    persist: str, citation: tuple[Union[str, None], Union[int, None]]
+) -> None:
+    path_pdf, number_page = citation
+    logger.debug(f"Path pdf {path_pdf} , number of page {number_page}")
+    if path_pdf is not None:
+        await set_message_citation(persist, path_pdf, number_page)
+
+
+@rsp_db_pipeline.stage(
+    "form", deps=("request", "conversation_id", "intent"), background=True
+)
+async def _form_stage(request: QueryRequest, conversation_id: str, intent: str) -> None:
+    if intent != "form":
+        return
+    logger.debug("User wants a form, sending on other server...")
+    form_questions = await generate_form(request.text)
+    form_id = await create_form(conversation_id, form_questions, locale="en")
+    logger.debug(f"Saved form {form_id} with {len(form_questions)} questions")
+
+
+async def answer_from_db(request: QueryRequest, conversation_id: str) -> str:
+    "Run the /rsp_db pipeline and return the text spoken back to the caller"
+    # un apel telefonic e salvat inainte de raspuns, ca /stop_call (orice worker) sa-l vada
+    wait = ("persist",) if request.call_sid else ()
+    results = await rsp_db_pipeline.run(wait, request=request, conversation_id=conversation_id)
+    intent, answer = results["intent"], results["answer"]
+    logger.debug(f"Intent for '{request.text}' : {intent}")
+    if intent == "form":
+        return f"sms sent for your personalized form on your query , {answer}"
+    if intent == "agent":
+        logger.debug("User wants an agent, sending on other server...")
+        return "Sent a sms"
+    return str(answer)
+
+
 # POST http://127.0.0.1:8000/rsp_db
 # {
 #   "text": "Who is Motor Third Party Insurance claim process",
@@ -175,61 +468,9 @@ async def q_db(request: QueryRequest):
 @app.post("/rsp_db")
 async def rsp_db(request: QueryRequest):  # -> TextResponse:
     try:
-        answer_form = await check_if_user_wants_form(request.text)
-        if re.search("YES", answer_form) is not None:
-            docs = query_db(request.text, request.collection_name, request.k)
-            answer_gpt = await final_response_gpt(request.text, docs)  # type: ignore
-
-            await append_message(
-                app.state.conversation_id, MessageRole.user, request.text
-            )
-            await append_message(
-                app.state.conversation_id,
-                MessageRole.bot,
-                f"sms sent for your personalized form on your query {answer_gpt}",
-            )
-            logger.debug("User wants a form, sending on other server...")
-            form_questions = await generate_form(request.text)
-            form_id = await create_form(
-                app.state.conversation_id, form_questions, locale="en"
-            )
-            logger.debug(f"Saved form {form_id} with {len(form_questions)} questions")
-
-            return TextResponse(
-                text=f"sms sent for your personalized form on your query , {answer_gpt}"
-            )
-
-        answer_human = await check_if_user_wants_agent(request.text)
-        if re.search("YES", answer_human) is not None:
-            await append_message(
-                app.state.conversation_id, MessageRole.user, request.text
-            )
-            await append_message(
-                app.state.conversation_id,
-                MessageRole.bot,
-                "Called an agent",
-            )
-            logger.debug("User wants an agent, sending on other server...")
-
-            return TextResponse(text="Sent a sms")
-
-        logger.debug(f"Check if user wants a form : {answer_form}")
-        docs = query_db(request.text, request.collection_name, request.k)
-        answer_gpt = await final_response_gpt(request.text, docs)  # type: ignore
-        path_pdf, number_page = await search_text_in_pdfs(
-            Path("./tmp_databases/"), docs[0]
-        )
-        logger.debug(f"Path pdf {path_pdf} , number of page {number_page}")
-
-        await append_message(app.state.conversation_id, MessageRole.user, request.text)
-        await append_message(
-            app.state.conversation_id,
-            MessageRole.bot,
-            answer_gpt,
-            path_df=str(path_pdf),
-            number_page=number_page,
-        )
-        return TextResponse(text=str(answer_gpt))
+        conversation_id = await conversation_for(request.call_sid)
+        text = await answer_from_db(request, conversation_id)
+        return TextResponse(text=text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -237,9 +478,12 @@ async def rsp_db(request: QueryRequest):  # -> TextResponse:
 @app.post("/stop_call")
 async def stop_call(request: TextRequest) -> TextResponse:
     phone = extract_phone(request.text)
+    logger.debug(f"Phone number {phone}")
+    if request.call_sid:
+        await close_conversation(call_sessions.end(request.call_sid), phone)
+        return TextResponse(text=f"Call {request.call_sid} ended. Phone={phone}.")
     await close_conversation(app.state.conversation_id, phone)
     app.state.conversation_id = await start_new_conversation(conv_id=str(uuid.uuid4()))
-    logger.debug(f"Phone number {phone}")
     return TextResponse(text=f"Call ended. Phone={phone}. New conversation started.")
 
 
@@ -248,18 +492,77 @@ async def stop_call(request: TextRequest) -> TextResponse:
 #   "text": "+40774596204"
 # }
 @app.post("/conv")
-async def conversations_by_phone(request: TextRequest):
-    conversations = await get_conversations_with_messages_by_phone(request.text)
+async def conversations_by_phone(
+    request: TextRequest,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Union[str, None] = Query(None),
+):
+    """
+    Conversations of a phone number (any spelling of it), newest first, one
+    page of `limit` at a time; the next one is asked for with the
+    X-Next-Cursor header value as `cursor`.
+    """
+    try:
+        conversations, next_cursor = await get_conversations_with_messages_by_phone(
+            request.text, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [conversation_to_dict(c) for c in conversations]
 
 
 @app.get("/forms")
 async def get_forms(
+    response: Response,
     conversation_id: Union[str, None] = Query(None),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Union[str, None] = Query(None),
 ):
-    forms = await list_forms(
-        conversation_id=conversation_id, limit=limit, offset=offset
-    )
+    """
+    Newest forms first. Pass the X-Next-Cursor header of a page as `cursor`
+    to get the next one (offset keeps working but gets slower with depth).
+    """
+    try:
+        forms, next_cursor = await list_forms(
+            conversation_id=conversation_id, limit=limit, offset=offset, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [form_to_dict(f) for f in forms]
+
+
+def _ndjson_response(rows: AsyncIterator[dict[str, Any]], filename: str) -> StreamingResponse:
+    async def lines() -> AsyncIterator[str]:
+        async for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# GET http://127.0.0.1:8000/export/conversations?since=2025-09-01T00:00:00&until=2025-10-01T00:00:00
+@app.get("/export/conversations")
+async def export_conversations(
+    since: Union[datetime, None] = Query(None),
+    until: Union[datetime, None] = Query(None),
+):
+    "One JSON line per conversation (with its messages), streamed from the database"
+    return _ndjson_response(stream_conversations(since, until), "conversations.ndjson")
+
+
+@app.get("/export/forms")
+async def export_forms(
+    since: Union[datetime, None] = Query(None),
+    until: Union[datetime, None] = Query(None),
+):
+    "One JSON line per form, streamed from the database"
+    return _ndjson_response(stream_forms(since, until), "forms.ndjson")
@@ -0,0 +1,148 @@
+# message_buffer.py - write-behind persistence of conversation messages
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Optional, Union
+
+from loguru import logger
+
+from .config import settings
+from .database import Message, SessionLocal
+
+
+class MessageBuffer:
+    """
+    Messages are queued in memory and written in one transaction per flush
+    (every `interval` seconds, or sooner once `max_batch` are waiting), so a
+    turn never waits on a commit. id and created_at are set when the message
+    is queued, so ordering does not depend on when it reaches the disk.
+    Readers call `flush` first; `stop` flushes what is left (shutdown).
+    A row the database rejects is logged and set aside in `dead_letter`.
+    """
+
+    def __init__(self, interval: float, max_batch: int) -> None:
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: list[dict[str, Any]] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Union[asyncio.Task, None] = None
+        # mesajele care nu au putut fi scrise, pastrate pentru inspectie
+        self.dead_letter: list[dict[str, Any]] = []
+        self.dead_letter_max = 1000
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="message-buffer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.dead_letter:
+            logger.error(f"{len(self.dead_letter)} messages could not be saved")
+
+    @staticmethod
+    def _stamp(fields: dict[str, Any]) -> dict[str, Any]:
+        fields.setdefault("id", str(uuid.uuid4()))
+        fields.setdefault("created_at", datetime.now(timezone.utc))
+        return fields
+
+    async def write(self, rows: list[dict[str, Any]]) -> list[str]:
+        "Write these messages right away in one transaction, bypassing the queue; returns their ids"
+        rows = [self._stamp(fields) for fields in rows]
+        await self._write(rows)
+        return [fields["id"] for fields in rows]
+
+    async def update(self, message_id: str, **fields: Any) -> bool:
+        """
+        Change a message still waiting in the queue; False when it is not
+        there (already written, the caller updates the row instead).
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # sub lock: un flush in curs se termina inainte, deci mesajul e ori in coada ori in db
+        async with self._lock:
+            for pending in self._pending:
+                if pending["id"] == message_id:
+                    pending.update(fields)
+                    return True
+        return False
+
+    def add(self, **fields: Any) -> str:
+        "Queue one message; returns its id"
+        self._stamp(fields)
+        self._pending.append(fields)
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+        return fields["id"]
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Message flush failed, retrying on the next tick")
+
+    async def _write(self, rows: list[dict[str, Any]]) -> None:
+        async with SessionLocal() as s:
+            s.add_all([Message(**fields) for fields in rows])
+            await s.commit()
+
+    async def flush(self) -> int:
+        """
+        Write every queued message in one transaction; returns how many were
+        written. If the batch fails it is retried row by row and the rows that
+        still fail go to `dead_letter` (logged), so one bad row never blocks
+        the others and readers calling flush first never fail because of it.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                await self._write(batch)
+                written = len(batch)
+            except asyncio.CancelledError:
+                # oprire in timpul scrierii: mesajele raman la inceputul cozii
+                self._pending = batch + self._pending
+                raise
+            except Exception:
+                logger.exception(f"Batch of {len(batch)} messages failed, writing them one by one")
+                written = 0
+                for i, fields in enumerate(batch):
+                    try:
+                        await self._write([fields])
+                        written += 1
+                    except asyncio.CancelledError:
+                        self._pending = batch[i:] + self._pending
+                        raise
+                    except Exception:
+                        logger.exception(
+                            f"Message {fields.get('id')} of {fields.get('conversation_id')} dropped"
+                        )
+                        self.dead_letter.append(fields)
+                del self.dead_letter[: -self.dead_letter_max]
+        logger.debug(f"Flushed {written} messages")
+        return written
+
+
+message_buffer = MessageBuffer(
+    interval=settings.MESSAGE_FLUSH_INTERVAL_SECONDS,
+    max_batch=settings.MESSAGE_FLUSH_MAX_BATCH,
+)
@@ -0,0 +1,98 @@
+# migrations.py - ordered schema migrations for app.db
+from datetime import datetime, timezone
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .phone import normalize_phone
+
+Migration = Callable[[Connection], None]
+
+
+def _0001_indexes(conn: Connection) -> None:
+    "Indexes behind /conv (phone, then messages by time) and /forms (newest first)"
+    for stmt in (
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_created_at ON messages(conversation_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_messages_created_at ON messages(created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_conversations_phone_number_started_at ON conversations(phone_number, started_at)",
+        "CREATE INDEX IF NOT EXISTS ix_forms_created_at ON forms(created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_forms_conversation_id_created_at ON forms(conversation_id, created_at)",
+    ):
+        conn.execute(text(stmt))
+    conn.execute(text("ANALYZE"))
+
+
+def _0002_phone_e164(conn: Connection) -> None:
+    "Canonical phone column (+ index) so the same number always finds its calls"
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(conversations)"))}
+    if "phone_e164" not in columns:
+        conn.execute(text("ALTER TABLE conversations ADD COLUMN phone_e164 TEXT"))
+    rows = conn.execute(
+        text("SELECT id, phone_number FROM conversations WHERE phone_number IS NOT NULL")
+    ).fetchall()
+    updates = [{"id": row[0], "e164": normalize_phone(row[1])} for row in rows]
+    if updates:
+        conn.execute(text("UPDATE conversations SET phone_e164 = :e164 WHERE id = :id"), updates)
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_conversations_phone_e164_started_at "
+            "ON conversations(phone_e164, started_at, id)"
+        )
+    )
+
+
+def _0003_export_indexes(conn: Connection) -> None:
+    "Exports and keyset pages walk conversations / forms in (time, id) order"
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_conversations_started_at_id "
+            "ON conversations(started_at, id)"
+        )
+    )
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_forms_created_at_id ON forms(created_at, id)")
+    )
+
+
+# adaugam doar la final, o migrare aplicata nu se mai modifica
+MIGRATIONS: list[tuple[str, Migration]] = [
+    ("0001_indexes", _0001_indexes),
+    ("0002_phone_e164", _0002_phone_e164),
+    ("0003_export_indexes", _0003_export_indexes),
+]
+
+
+def _apply(conn: Connection) -> list[str]:
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                applied_at TEXT NOT NULL
+            )
+            """
+        )
+    )
+    applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    done = []
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        migration(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, applied_at) VALUES (:v, :t)"),
+            {"v": version, "t": datetime.now(timezone.utc).isoformat()},
+        )
+        done.append(version)
+    return done
+
+
+async def run_migrations(engine: AsyncEngine) -> None:
+    "Apply the pending migrations, all in one transaction"
+    async with engine.begin() as conn:
+        done = await conn.run_sync(_apply)
+    if done:
+        logger.info(f"Applied migrations: {', '.join(done)}")
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, field_validator
+from typing import Literal, Optional
+from pydantic import BaseModel, field_validator, model_validator
 from pathlib import Path
 
 
@@ -15,6 +16,7 @@ class TextResponse(BaseModel):
 
 class TextRequest(BaseModel):
     text: str
+    call_sid: Optional[str] = None  # Twilio CallSid, one conversation per call
 
     @field_validator("text")
     def check_request(cls, x):
@@ -50,6 +52,8 @@ class QueryRequest(BaseModel):
     text: str
     collection_name: str
     k: int
+    mode: Optional[Literal["vector", "hybrid", "fast"]] = None  # default: settings.RETRIEVAL_MODE
+    call_sid: Optional[str] = None
 
     @field_validator("text", "collection_name")
     @classmethod
@@ -66,6 +70,34 @@ class QueryRequest(BaseModel):
         return v
 
 
+class MultiQueryRequest(BaseModel):
+    "Search several collections at once: listed by name and/or all documents of a tag"
+    text: str
+    collection_names: list[str] = []
+    tag: Optional[str] = None
+    k: int
+
+    @field_validator("text")
+    @classmethod
+    def not_empty(cls, v: str) -> str:
+        if not v.strip():
+            raise ValueError("must not be empty")
+        return v
+
+    @field_validator("k")
+    @classmethod
+    def positive_k(cls, v: int) -> int:
+        if v <= 0:
+            raise ValueError("k must be > 0")
+        return v
+
+    @model_validator(mode="after")
+    def has_target(self) -> "MultiQueryRequest":
+        if not self.collection_names and not self.tag:
+            raise ValueError("collection_names or tag is required")
+        return self
+
+
 class PdfsRequest(BaseModel):
     paths: list[Path]
 
@@ -75,3 +107,9 @@ class PdfsRequest(BaseModel):
             return 0
         else:
             return x
+
+
+class TranscriptionItem(BaseModel):
+    filename: str
+    text: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,33 @@
+# phone.py - canonical (E.164) form of the phone numbers callers give us
+import re
+from typing import Union
+
+from .config import settings
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(
+    raw: Union[str, None], default_country: str = settings.DEFAULT_COUNTRY_CODE
+) -> Union[str, None]:
+    """
+    "+40 774 596 204", "0040774596204", "0774 596 204" -> "+40774596204".
+    Numbers without a country prefix get `default_country`; None when what is
+    left is not a plausible number (E.164 allows at most 15 digits).
+    """
+    if not raw:
+        return None
+    raw = raw.strip()
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        # prefixul national (0) se inlocuieste cu codul tarii
+        digits = default_country + digits[1:]
+    elif len(digits) <= 9:
+        digits = default_country + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return f"+{digits}"
@@ -0,0 +1,82 @@
+# pipeline.py - small dependency graph of async stages
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+StageFn = Callable[..., Awaitable[Any]]
+
+
+class Pipeline:
+    """
+    Named async stages with dependencies. `run` starts every stage at once and
+    each stage only awaits what it depends on, so independent stages overlap
+    and the latency is the critical path instead of the sum of all stages.
+
+    A dependency is either a run input or another stage; the stage function is
+    called with them as keyword arguments. Background stages (persistence, ...)
+    are started too but not awaited by `run`: the response goes out first and
+    `drain` waits for whatever is still running (used at shutdown).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._stages: dict[str, tuple[StageFn, tuple[str, ...], bool]] = {}
+        self._background: set[asyncio.Task] = set()
+
+    def stage(self, name: str, deps: tuple[str, ...] = (), background: bool = False):
+        def register(fn: StageFn) -> StageFn:
+            if name in self._stages:
+                raise ValueError(f"Stage {name} already defined in {self.name}")
+            self._stages[name] = (fn, deps, background)
+            return fn
+
+        return register
+
+    async def run(self, wait: tuple[str, ...] = (), **inputs: Any) -> dict[str, Any]:
+        """
+        Run the graph and return the results of the foreground stages. The
+        background stages named in `wait` are waited for too (their failures
+        are only logged, like any background stage).
+        """
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def _run_stage(name: str) -> Any:
+            fn, deps, _ = self._stages[name]
+            kwargs = {}
+            for dep in deps:
+                kwargs[dep] = await tasks[dep] if dep in tasks else inputs[dep]
+            return await fn(**kwargs)
+
+        # toate task-urile exista inainte ca vreun stage sa-si astepte dependintele
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(_run_stage(name), name=f"{self.name}.{name}")
+
+        foreground = {n: t for n, t in tasks.items() if not self._stages[n][2]}
+        for name, task in tasks.items():
+            if self._stages[name][2]:
+                self._background.add(task)
+                task.add_done_callback(self._background_done)
+
+        try:
+            await asyncio.gather(*foreground.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        waited = [tasks[name] for name in wait]
+        if waited:
+            await asyncio.wait(waited)
+        return {name: task.result() for name, task in foreground.items()}
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error(
+                f"Background stage {task.get_name()} failed"
+            )
+
+    async def drain(self) -> None:
+        "Wait for the background stages still running"
+        if self._background:
+            await asyncio.gather(*list(self._background), return_exceptions=True)
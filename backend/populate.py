@@ -1,26 +1,26 @@
 # populate.py
-import chromadb
 import json
 from loguru import logger
 
-# chromadb imports
-from chromadb.api.types import EmbeddingFunction
-import chromadb.utils.embedding_functions as embedding_functions
-
 # local imports
-from .config import settings
+from .chroma_registry import chroma
+from .embeddings import embedding_backend
+from .tmp_databases.cache import qa_store
+from .tmp_databases.lexical import lexical_index
+from .tmp_databases.query import reset_collection
+from .vector_index import vector_tier
+
+FAQ_SCOPE = "my_db"
+
 
-client = chromadb.PersistentClient(path="./db/")
+def faq_collection():
+    "Handle of the FAQ collection, resolved once by the registry"
+    return chroma.get_or_create(FAQ_SCOPE)
 
-openai_embedding: EmbeddingFunction = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=settings.OPENAI_API_KEY,
-    model_name=settings.OPENAI_MODEL_NAME_EMBEDDING,
-)
 
-collection = client.get_or_create_collection(
-    name="my_db",
-    embedding_function=openai_embedding,  # type:ignore
-)
+def faq_text(question: str, answer: str) -> str:
+    "What the lexical index sees of a FAQ entry"
+    return f"{question}\n{answer}"
 
 
 def populate_db(path: str = "./db.json"):
@@ -30,7 +30,20 @@ def populate_db(path: str = "./db.json"):
     qs = [q["question"] for q in questions]
     answers = [q["answer"] for q in questions]
 
-    collection.add(documents=qs, ids=answers)
+    if chroma.is_stale(FAQ_SCOPE):
+        # alt backend de embeddings: re-seed-ul reconstruieste colectia de la zero
+        reset_collection(FAQ_SCOPE)
+    collection = faq_collection()
+    collection.upsert(documents=qs, ids=answers, embeddings=embedding_backend().embed(qs))  # type: ignore
+    # intrebarile scoase din db.json nu mai trebuie sa raspunda
+    stale = [i for i in collection.get(include=[])["ids"] if i not in set(answers)]
+    if stale:
+        collection.delete(ids=stale)
+    # raspunsul intra si el in indexul lexical, termenii exacti apar des acolo
+    lexical_index.drop(FAQ_SCOPE)
+    lexical_index.add(FAQ_SCOPE, [(a, faq_text(q, a), None) for q, a in zip(qs, answers)])
+    vector_tier.refresh(FAQ_SCOPE)
+    qa_store.invalidate(FAQ_SCOPE)
     logger.info(f"Number of documents in populated collection: {collection.count()}")
 
 
@@ -0,0 +1,141 @@
+# providers.py - process-wide OpenAI clients shared by every model call
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Sequence, Union
+
+import httpx
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from .config import settings
+
+_limits = httpx.Limits(
+    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+    keepalive_expiry=60,
+)
+_timeout = httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=5)
+
+_http_client: Union[httpx.AsyncClient, None] = None
+_sync_http_client: Union[httpx.Client, None] = None
+_openai_client: Union[AsyncOpenAI, None] = None
+_sync_openai_client: Union[OpenAI, None] = None
+_chat_models: dict[tuple[float, int], ChatOpenAI] = {}
+_chains: dict[str, Runnable] = {}
+_semaphore: Union[asyncio.Semaphore, None] = None
+
+
+def http_client() -> httpx.AsyncClient:
+    "Pooled keep-alive client, one TLS handshake per connection instead of per call"
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=_limits, timeout=_timeout)
+    return _http_client
+
+
+def sync_http_client() -> httpx.Client:
+    "Same pool for the sync paths that run in worker threads (chroma, ingestion)"
+    global _sync_http_client
+    if _sync_http_client is None or _sync_http_client.is_closed:
+        _sync_http_client = httpx.Client(limits=_limits, timeout=_timeout)
+    return _sync_http_client
+
+
+def openai_client() -> AsyncOpenAI:
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY, http_client=http_client(), max_retries=2
+        )
+    return _openai_client
+
+
+def sync_openai_client() -> OpenAI:
+    global _sync_openai_client
+    if _sync_openai_client is None:
+        _sync_openai_client = OpenAI(
+            api_key=settings.OPENAI_API_KEY, http_client=sync_http_client(), max_retries=2
+        )
+    return _sync_openai_client
+
+
+def chat_model(temperature: float = 0.2, max_tokens: int = 100) -> ChatOpenAI:
+    key = (temperature, max_tokens)
+    model = _chat_models.get(key)
+    if model is None:
+        model = ChatOpenAI(
+            model=settings.OPENAI_MODEL_NAME_TEXT,
+            api_key=settings.OPENAI_API_KEY,  # type: ignore
+            temperature=temperature,
+            max_tokens=max_tokens,  # type: ignore
+            http_client=sync_http_client(),
+            http_async_client=http_client(),
+        )
+        _chat_models[key] = model
+    return model
+
+
+def chain(name: str, build: Callable[[], Runnable]) -> Runnable:
+    "Prompt chains are built once per process and reused by every call"
+    runnable = _chains.get(name)
+    if runnable is None:
+        runnable = _chains[name] = build()
+    return runnable
+
+
+@asynccontextmanager
+async def limit() -> AsyncIterator[None]:
+    "Bounds the model calls in flight (settings.OPENAI_MAX_CONCURRENCY)"
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+    async with _semaphore:
+        yield
+
+
+def embed_texts(texts: Sequence[str]) -> list[list[float]]:
+    response = sync_openai_client().embeddings.create(
+        model=settings.OPENAI_MODEL_NAME_EMBEDDING, input=list(texts)
+    )
+    return [d.embedding for d in response.data]
+
+
+async def aembed_texts(texts: Sequence[str]) -> list[list[float]]:
+    async with limit():
+        response = await openai_client().embeddings.create(
+            model=settings.OPENAI_MODEL_NAME_EMBEDDING, input=list(texts)
+        )
+    return [d.embedding for d in response.data]
+
+
+async def synthesize_speech(text: str, voice: str, response_format: str = "mp3") -> bytes:
+    async with limit():
+        response = await openai_client().audio.speech.create(
+            model=settings.OPENAI_MODEL_NAME_TTS,
+            voice=voice,  # type: ignore
+            input=text,
+            response_format=response_format,  # type: ignore
+        )
+    return response.content
+
+
+async def transcribe(file: Any) -> str:
+    "`file` is anything the OpenAI SDK accepts, e.g. (filename, bytes)"
+    async with limit():
+        transcription = await openai_client().audio.transcriptions.create(
+            model=settings.OPENAI_MODEL_NAME_STT, file=file
+        )
+    return transcription.text
+
+
+async def aclose() -> None:
+    global _http_client, _sync_http_client, _openai_client, _sync_openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    if _sync_http_client is not None:
+        _sync_http_client.close()
+    _http_client = _sync_http_client = None
+    _openai_client = _sync_openai_client = None
+    _chat_models.clear()
+    _chains.clear()
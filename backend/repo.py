@@ -1,11 +1,14 @@
 # repo.py
+import base64
+import json
 import re
 import unicodedata
-from typing import Optional, Union, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional, Union
 import uuid
 from datetime import datetime, timezone
 from loguru import logger
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from .database import (
     SessionLocal,
@@ -15,6 +18,8 @@ from .database import (
     ConversationLabel,
     Form,
 )
+from .message_buffer import message_buffer
+from .phone import normalize_phone
 
 PHONE_RE = re.compile(r"\+?\d[\d\s\-()]{6,}")
 
@@ -25,9 +30,12 @@ def extract_phone(text: str) -> Union[str, None]:
 
 
 async def start_new_conversation(conv_id: str) -> str:
+    "Create the conversation; idempotent, an existing id is returned as is"
     conv_id = conv_id or str(uuid.uuid4())
 
     async with SessionLocal() as s:
+        if await s.get(Conversation, conv_id) is not None:
+            return conv_id
         s.add(
             Conversation(
                 id=conv_id,
@@ -36,7 +44,11 @@ async def start_new_conversation(conv_id: str) -> str:
                 ended_at=None,
             )
         )
-        await s.commit()
+        try:
+            await s.commit()
+        except IntegrityError:
+            # alt worker a creat-o intre timp
+            await s.rollback()
     return conv_id
 
 
@@ -46,17 +58,68 @@ async def append_message(
     text: str,
     path_df: Optional[str] = None,
     number_page: Optional[int] = None,
-):
+) -> str:
+    """
+    Queue the message for the write-behind buffer and return its id; it
+    reaches app.db on the next flush (written right away when the buffer
+    is not running, e.g. from a script).
+    """
+    message_id = message_buffer.add(
+        conversation_id=conversation_id,
+        role=role,
+        text=text,
+        path_df=path_df,
+        number_page=number_page,
+    )
+    if not message_buffer.running:
+        await message_buffer.flush()
+    return message_id
+
+
+async def append_turn(
+    conversation_id: str,
+    user_text: str,
+    bot_text: str,
+    path_df: Optional[str] = None,
+    number_page: Optional[int] = None,
+    durable: bool = False,
+) -> str:
+    """
+    The caller's message and the bot's reply; returns the reply's id.
+    `durable` writes both in one transaction before returning: phone-call
+    turns, whose call may be closed by another worker that cannot flush
+    this one's buffer.
+    """
+    rows = [
+        dict(conversation_id=conversation_id, role=MessageRole.user, text=user_text),
+        dict(
+            conversation_id=conversation_id,
+            role=MessageRole.bot,
+            text=bot_text,
+            path_df=path_df,
+            number_page=number_page,
+        ),
+    ]
+    if durable:
+        return (await message_buffer.write(rows))[-1]
+    ids = [message_buffer.add(**fields) for fields in rows]
+    if not message_buffer.running:
+        await message_buffer.flush()
+    return ids[-1]
+
+
+async def set_message_citation(
+    message_id: str, path_df: Optional[str], number_page: Optional[int]
+) -> None:
+    "Attach the cited pdf / page to a reply saved before the citation was known"
+    if await message_buffer.update(message_id, path_df=path_df, number_page=number_page):
+        return
     async with SessionLocal() as s:
-        s.add(
-            Message(
-                conversation_id=conversation_id,
-                role=role,
-                text=text,
-                path_df=path_df,
-                number_page=number_page,
-            )
-        )
+        message = await s.get(Message, message_id)
+        if message is None:
+            return
+        message.path_df = path_df
+        message.number_page = number_page
         await s.commit()
 
 
@@ -81,6 +144,8 @@ HUMAN_RE = re.compile(
 
 
 async def close_conversation(conversation_id: str, phone_number: Union[str, None]):
+    # eticheta depinde de ultimul mesaj, deci trebuie sa fie scris
+    await message_buffer.flush()
     async with SessionLocal() as s:
         conv = await s.get(Conversation, conversation_id)
         if not conv:
@@ -105,41 +170,72 @@ async def close_conversation(conversation_id: str, phone_number: Union[str, None
 
         if phone_number and not conv.phone_number:
             conv.phone_number = phone_number
+            conv.phone_e164 = normalize_phone(phone_number)
         conv.ended_at = datetime.now(timezone.utc)
         conv.label = label
 
         await s.commit()
 
 
+def encode_cursor(at: datetime, row_id: str) -> str:
+    "Opaque keyset cursor: the (timestamp, id) of the last row of a page"
+    raw = json.dumps([at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        at, row_id = json.loads(raw)
+        return datetime.fromisoformat(at), str(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 async def get_conversations_with_messages_by_phone(
     phone_number: str,
-) -> list[Conversation]:
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> tuple[list[Conversation], Union[str, None]]:
     """
     We return a list of conversations based on phone_number sorted by timestamp
+    (newest first, messages oldest first, both ordered by the database), and
+    the cursor of the next page when `limit` cut the list short.
     """
+    await message_buffer.flush()
+    e164 = normalize_phone(phone_number)
+    stmt = (
+        select(Conversation)
+        .options(selectinload(Conversation.messages))
+        .order_by(Conversation.started_at.desc(), Conversation.id.desc())
+    )
+    if e164 is not None:
+        stmt = stmt.where(Conversation.phone_e164 == e164)
+    else:
+        stmt = stmt.where(Conversation.phone_number == phone_number)
+    if cursor:
+        at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Conversation.started_at, Conversation.id) < tuple_(at, row_id))
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+
     async with SessionLocal() as s:
-        stmt = (
-            select(Conversation)
-            .where(Conversation.phone_number == phone_number)
-            .options(selectinload(Conversation.messages))
-            .order_by(Conversation.started_at.desc())
-        )
         res = await s.execute(stmt)
-        conversations = res.scalars().all()
+        conversations = list(res.scalars().all())
 
-        # sortam mesajele crescator
-        for conv in conversations:
-            conv.messages.sort(
-                key=lambda m: m.created_at or datetime.min.replace(tzinfo=timezone.utc)
-            )
-
-        return conversations  # type:ignore
+    next_cursor = None
+    if limit is not None and len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.started_at, last.id)
+    return conversations, next_cursor
 
 
 def conversation_to_dict(conv: Conversation) -> Dict[str, Any]:
     return {
         "id": conv.id,
         "phone_number": conv.phone_number,
+        "phone_e164": conv.phone_e164,
         "started_at": conv.started_at.isoformat() if conv.started_at else None,
         "ended_at": conv.ended_at.isoformat() if conv.ended_at else None,
         "label": (
@@ -182,20 +278,36 @@ async def list_forms(
     conversation_id: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
-) -> list[Form]:
-    async with SessionLocal() as s:
-        stmt = (
-            select(Form)
-            .options(selectinload(Form.conversation))
-            .order_by(Form.created_at.desc())
-            .limit(limit)
-            .offset(offset)
-        )
-        if conversation_id:
-            stmt = stmt.where(Form.conversation_id == conversation_id)
+    cursor: Optional[str] = None,
+) -> tuple[list[Form], Union[str, None]]:
+    """
+    Newest forms first, one page of `limit`, and the cursor of the next page
+    (None on the last one). `cursor` is a (created_at, id) keyset position;
+    `offset` is still honoured when no cursor is given.
+    """
+    stmt = (
+        select(Form)
+        .options(selectinload(Form.conversation))
+        .order_by(Form.created_at.desc(), Form.id.desc())
+        .limit(limit + 1)
+    )
+    if conversation_id:
+        stmt = stmt.where(Form.conversation_id == conversation_id)
+    if cursor:
+        at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Form.created_at, Form.id) < tuple_(at, row_id))
+    elif offset:
+        stmt = stmt.offset(offset)
 
+    async with SessionLocal() as s:
         res = await s.execute(stmt)
-        return res.scalars().all()  # type:ignore
+        forms = list(res.scalars().all())
+
+    next_cursor = None
+    if len(forms) > limit:
+        forms = forms[:limit]
+        next_cursor = encode_cursor(forms[-1].created_at, forms[-1].id)
+    return forms, next_cursor
 
 
 def form_to_dict(f: Form) -> Dict[str, Any]:
@@ -220,3 +332,132 @@ def form_to_dict(f: Form) -> Dict[str, Any]:
         if conv
         else None,
     }
+
+
+def _iso(value: Optional[datetime]) -> Union[str, None]:
+    return value.isoformat() if value else None
+
+
+def _enum_value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+EXPORT_BATCH = 500
+
+
+def _as_utc(at: Optional[datetime]) -> Optional[datetime]:
+    "Times are stored as naive UTC; an offset-aware bound is converted first (naive ones are UTC)"
+    if at is None or at.tzinfo is None:
+        return at
+    return at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def stream_conversations(
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Every conversation started in [since, until) with its messages, oldest
+    first, read through a server-side cursor. Plain rows (no ORM objects), so
+    memory holds one conversation at a time however long the export is.
+    """
+    await message_buffer.flush()
+    since, until = _as_utc(since), _as_utc(until)
+    stmt = (
+        select(
+            Conversation.id,
+            Conversation.phone_number,
+            Conversation.phone_e164,
+            Conversation.started_at,
+            Conversation.ended_at,
+            Conversation.label,
+            Message.id.label("message_id"),
+            Message.role,
+            Message.text,
+            Message.created_at,
+            Message.path_df,
+            Message.number_page,
+        )
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .order_by(Conversation.started_at, Conversation.id, Message.created_at, Message.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    if since is not None:
+        stmt = stmt.where(Conversation.started_at >= since)
+    if until is not None:
+        stmt = stmt.where(Conversation.started_at < until)
+
+    async with SessionLocal() as s:
+        result = await s.stream(stmt)
+        current: Union[Dict[str, Any], None] = None
+        async for row in result:
+            if current is None or current["id"] != row.id:
+                if current is not None:
+                    yield current
+                current = {
+                    "id": row.id,
+                    "phone_number": row.phone_number,
+                    "phone_e164": row.phone_e164,
+                    "started_at": _iso(row.started_at),
+                    "ended_at": _iso(row.ended_at),
+                    "label": _enum_value(row.label),
+                    "messages": [],
+                }
+            if row.message_id is not None:
+                current["messages"].append(
+                    {
+                        "id": row.message_id,
+                        "role": _enum_value(row.role),
+                        "text": row.text,
+                        "created_at": _iso(row.created_at),
+                        "path_df": row.path_df,
+                        "number_page": row.number_page,
+                    }
+                )
+        if current is not None:
+            yield current
+
+
+async def stream_forms(
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    "Every form created in [since, until), oldest first, with its conversation"
+    since, until = _as_utc(since), _as_utc(until)
+    stmt = (
+        select(
+            Form.id,
+            Form.conversation_id,
+            Form.questions,
+            Form.locale,
+            Form.created_at,
+            Conversation.phone_number,
+            Conversation.label,
+            Conversation.started_at,
+            Conversation.ended_at,
+        )
+        .outerjoin(Conversation, Conversation.id == Form.conversation_id)
+        .order_by(Form.created_at, Form.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    if since is not None:
+        stmt = stmt.where(Form.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Form.created_at < until)
+
+    async with SessionLocal() as s:
+        result = await s.stream(stmt)
+        async for row in result:
+            yield {
+                "id": row.id,
+                "conversation_id": row.conversation_id,
+                "questions": row.questions or [],
+                "locale": row.locale,
+                "created_at": _iso(row.created_at),
+                "conversation": {
+                    "phone_number": row.phone_number,
+                    "label": _enum_value(row.label),
+                    "started_at": _iso(row.started_at),
+                    "ended_at": _iso(row.ended_at),
+                }
+                if row.started_at is not None
+                else None,
+            }
@@ -0,0 +1,117 @@
+# seeding.py - startup seeding, skipped when the sources did not change
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable
+
+from loguru import logger
+
+from .chroma_registry import chroma
+from .embeddings import embedding_backend
+from .populate import FAQ_SCOPE, faq_text, populate_db
+from .tmp_databases.lexical import lexical_index
+from .vector_index import vector_tier
+from .tmp_databases.page_index import index_missing_pdfs
+from .tmp_databases.query import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    INSURANCE_PDF,
+    build_lexical_index,
+    populate_db_tmp,
+)
+
+SEED_STATE_PATH = os.path.join(os.getcwd(), "seed_state.json")
+FAQ_PATH = str(Path(__file__).with_name("db.json"))
+
+
+def fingerprint(path: str, **params: Any) -> str:
+    "sha256 of the source bytes plus everything that changes what gets embedded"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_state() -> dict[str, str]:
+    try:
+        with open(SEED_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: dict[str, str]) -> None:
+    tmp = f"{SEED_STATE_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, SEED_STATE_PATH)
+
+
+def seed_if_changed(name: str, fp: str, seed: Callable[[], None]) -> bool:
+    "Run `seed` only when the fingerprint differs from the recorded one"
+    state = _load_state()
+    if state.get(name) == fp:
+        logger.debug(f"Seed {name} unchanged, skipped")
+        return False
+    seed()
+    state[name] = fp
+    _save_state(state)
+    logger.info(f"Seed {name} done")
+    return True
+
+
+def seed_all() -> None:
+    "Each seed is guarded so one failure does not stop the others (or startup)"
+    seeds = [
+        (
+            "faq",
+            lambda: fingerprint(FAQ_PATH, backend=embedding_backend().id),
+            lambda: populate_db(path=FAQ_PATH),
+        ),
+        (
+            "insurance_docs",
+            lambda: fingerprint(
+                INSURANCE_PDF,
+                backend=embedding_backend().id,
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+            ),
+            populate_db_tmp,
+        ),
+    ]
+    for name, fp, seed in seeds:
+        try:
+            seed_if_changed(name, fp(), seed)
+        except Exception as e:
+            logger.warning(f"Seed {name} skipped due to error: {e}")
+
+    # pdfs uploaded before the page store existed still need their pages indexed
+    indexed = index_missing_pdfs(Path("./tmp_databases/"))
+    logger.debug(f"Backfilled {indexed} pdfs into the page store")
+    backfill_lexical()
+    # colectiile fierbinti se incarca dupa seed, ca sa nu fie reconstruite de doua ori
+    vector_tier.load_all()
+
+
+def backfill_lexical() -> None:
+    "Collections ingested before the BM25 index existed get it built from Chroma once"
+    for name in chroma.names():
+        if lexical_index.has_collection(name):
+            continue
+        try:
+            if name == FAQ_SCOPE:
+                # in colectia FAQ id-ul este raspunsul, documentul este intrebarea
+                count = build_lexical_index(name, text_of=lambda a, q: faq_text(q or "", a))
+            else:
+                count = build_lexical_index(name)
+            logger.debug(f"Built the lexical index of {name}: {count} documents")
+        except Exception as e:
+            logger.warning(f"Could not build the lexical index of {name}: {e}")
+
+
+async def run_seeding() -> None:
+    await asyncio.to_thread(seed_all)
@@ -0,0 +1,67 @@
+# sessions.py - one conversation per phone call, keyed by the Twilio CallSid
+import time
+import uuid
+from collections import OrderedDict
+
+from loguru import logger
+
+from .config import settings
+from .repo import start_new_conversation
+
+# uuid5 din CallSid: orice worker ajunge la acelasi id pentru acelasi apel
+CALL_NAMESPACE = uuid.UUID("5f0c6a52-8d7e-4c3e-9b7a-3f1d2c4b6e81")
+
+
+def conversation_id_for(call_sid: str) -> str:
+    return str(uuid.uuid5(CALL_NAMESPACE, call_sid))
+
+
+class CallSessions:
+    """
+    CallSid -> conversation id of the calls this worker has seen. The id is
+    derived from the CallSid, so workers never disagree, and the conversation
+    row is created idempotently, so whichever worker gets the first turn
+    creates it. The map only saves that round trip: it is bounded (least
+    recently used calls go first) and forgets calls idle for `idle_seconds`.
+    """
+
+    def __init__(self, max_sessions: int, idle_seconds: float) -> None:
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float) -> None:
+        # cele mai vechi sunt la inceput
+        while self._sessions:
+            call_sid, (_, last_seen) = next(iter(self._sessions.items()))
+            if now - last_seen < self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            logger.debug(f"Call session {call_sid} dropped from the registry")
+
+    async def conversation(self, call_sid: str) -> str:
+        "Conversation of the call, created on its first turn"
+        now = time.monotonic()
+        session = self._sessions.get(call_sid)
+        if session is None:
+            conversation_id = await start_new_conversation(conversation_id_for(call_sid))
+        else:
+            conversation_id = session[0]
+        self._sessions[call_sid] = (conversation_id, now)
+        self._sessions.move_to_end(call_sid)
+        self._expire(now)
+        return conversation_id
+
+    def end(self, call_sid: str) -> str:
+        "Forget the call; returns its conversation id (known on any worker)"
+        session = self._sessions.pop(call_sid, None)
+        return session[0] if session else conversation_id_for(call_sid)
+
+
+call_sessions = CallSessions(
+    max_sessions=settings.CALL_SESSIONS_MAX,
+    idle_seconds=settings.CALL_SESSION_IDLE_SECONDS,
+)
@@ -0,0 +1,51 @@
+import asyncio
+import hashlib
+import io
+
+from fastapi import UploadFile
+
+from backend import documents
+
+
+def _upload(content: bytes, tag: str):
+    file = UploadFile(file=io.BytesIO(content), filename="policy.pdf")
+    return asyncio.run(documents.upload_and_index(file=file, tag=tag, replaces=None))
+
+
+def test_duplicate_upload_under_a_new_tag_is_linked(tmp_path, monkeypatch):
+    monkeypatch.setattr(documents, "DOC_DB_PATH", str(tmp_path / "documents.db"))
+    documents._init_doc_db()
+    content = b"%PDF-1.4 same bytes"
+    doc_id = documents._insert_document(
+        "policy.pdf",
+        str(tmp_path / "policy.pdf"),
+        "docs_original",
+        hashlib.sha256(content).hexdigest(),
+        "tenant_a",
+    )
+    documents._set_ingest_state(doc_id, "indexed")
+
+    result = _upload(content, "tenant_b")
+
+    assert result["duplicate"] is True
+    assert result["collection"] == "docs_original"
+    assert result["tag"] == "tenant_b"
+    assert documents.collections_for_tag("tenant_a") == ["docs_original"]
+    assert documents.collections_for_tag("tenant_b") == ["docs_original"]
+
+
+def test_duplicate_upload_under_the_same_tag_adds_no_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(documents, "DOC_DB_PATH", str(tmp_path / "documents.db"))
+    documents._init_doc_db()
+    content = b"%PDF-1.4 same bytes"
+    documents._insert_document(
+        "policy.pdf",
+        str(tmp_path / "policy.pdf"),
+        "docs_original",
+        hashlib.sha256(content).hexdigest(),
+        "tenant_a",
+    )
+
+    _upload(content, "tenant_a")
+
+    assert len(documents._fetch_documents()) == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from backend.core_functions import classify_intent_local
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("I want to buy a policy", "form"),
+        ("I'd like to get a quote", "form"),
+        ("I want to file a claim", "form"),
+        ("vreau să fac o asigurare", "form"),
+        ("I want to speak with an agent", "agent"),
+        ("vreau sa vorbesc cu un operator", "agent"),
+        ("sună-mă", "agent"),
+        ("please call me back", "agent"),
+    ],
+)
+def test_explicit_requests_are_decided_locally(text, expected):
+    assert classify_intent_local(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # cuvinte de formular intr-o intrebare de info
+        "How does the discount apply to my policy",
+        "What is the quote process",
+        "buy",
+        "I'd like a new policy",
+        "What does the policy cover?",
+        "Do I need to talk to an agent?",
+    ],
+)
+def test_everything_else_goes_to_the_llm(text):
+    assert classify_intent_local(text) is None
@@ -1,43 +1,233 @@
-
-# cache.py - simple SQLite cache for Q/A
-import sqlite3
-from datetime import datetime
-from typing import Optional
-
-class QAStore:
-    def __init__(self, db_path: str = "cache.db") -> None:
-        self.db_path = db_path
-        self._init_db()
-
-    def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS qa_cache (
-                    qkey TEXT PRIMARY KEY,
-                    question TEXT NOT NULL,
-                    answer   TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            conn.commit()
-
-    def _mk_key(self, question: str, scope: str) -> str:
-        return f"{scope}::{question.strip()}"
-
-    def get_answer(self, question: str, scope: str = "general") -> Optional[str]:
-        key = self._mk_key(question, scope)
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("SELECT answer FROM qa_cache WHERE qkey = ?", (key,))
-            row = cur.fetchone()
-            return row[0] if row else None
-
-    def save_qa(self, question: str, answer: str, scope: str = "general") -> None:
-        key = self._mk_key(question, scope)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO qa_cache(qkey, question, answer, created_at) VALUES (?, ?, ?, ?)",
-                (key, question.strip(), answer, datetime.utcnow().isoformat(timespec="seconds")),
-            )
-            conn.commit()
+# cache.py - semantic SQLite cache for Q/A
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from ..config import settings
+
+
+class _ScopeEntries:
+    "Hot tier of one scope: normalized question embeddings stacked in a matrix"
+
+    def __init__(self) -> None:
+        self.ids: list[int] = []
+        self.answers: list[str] = []
+        self.created_at: list[float] = []
+        self.matrix: Optional[np.ndarray] = None
+
+    def add(self, row_id: int, answer: str, created_at: float, vector: np.ndarray) -> None:
+        self.ids.append(row_id)
+        self.answers.append(answer)
+        self.created_at.append(created_at)
+        row = vector[None, :]
+        self.matrix = row if self.matrix is None else np.vstack([self.matrix, row])
+
+    def discard(self, row_ids: set[int]) -> None:
+        "Forget the rows deleted from SQLite"
+        keep = [i for i, row_id in enumerate(self.ids) if row_id not in row_ids]
+        if len(keep) == len(self.ids):
+            return
+        self.ids = [self.ids[i] for i in keep]
+        self.answers = [self.answers[i] for i in keep]
+        self.created_at = [self.created_at[i] for i in keep]
+        self.matrix = self.matrix[keep] if self.matrix is not None and keep else None
+
+    def drop_first(self, n: int) -> None:
+        if n <= 0:
+            return
+        del self.ids[:n], self.answers[:n], self.created_at[:n]
+        self.matrix = self.matrix[n:] if self.matrix is not None and self.ids else None
+
+
+def _question_key(question: str) -> str:
+    return re.sub(r"\s+", " ", question or "").strip().casefold()
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+class QAStore:
+    """
+    Answers keyed by the embedding of the question that produced them.
+    A new question whose cosine similarity to a cached one (same scope) is
+    above `threshold` gets the stored answer back. Scopes are the FAQ
+    collection or a docs collection; re-indexing a collection invalidates it.
+    Each scope keeps its newest `hot_items` answers, all of them searched in
+    memory; older ones are deleted as new ones are saved. `get_exact` finds
+    an answer by its question text alone (fast path, no embedding).
+    """
+
+    def __init__(
+        self,
+        db_path: str = "cache.db",
+        threshold: float = 0.95,
+        ttl_seconds: int = 24 * 3600,
+        hot_items: int = 512,
+    ) -> None:
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.hot_items = hot_items
+        self._lock = threading.Lock()
+        self._hot: dict[str, _ScopeEntries] = {}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS qa_answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer   TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_qa_answers_scope_created_at
+                ON qa_answers(scope, created_at);
+            CREATE INDEX IF NOT EXISTS ix_qa_answers_scope_question
+                ON qa_answers(scope, question);
+            """
+        )
+        self._conn.commit()
+
+    def _load_scope(self, scope: str, dim: int) -> _ScopeEntries:
+        entries = self._hot.get(scope)
+        if entries is not None and (entries.matrix is None or entries.matrix.shape[1] == dim):
+            return entries
+        entries = _ScopeEntries()
+        rows = self._conn.execute(
+            """
+            SELECT id, answer, created_at, embedding FROM (
+                SELECT * FROM qa_answers WHERE scope = ? AND created_at >= ?
+                ORDER BY created_at DESC LIMIT ?
+            ) ORDER BY created_at ASC
+            """,
+            (scope, time.time() - self.ttl_seconds, self.hot_items),
+        ).fetchall()
+        for row_id, answer, created_at, blob in rows:
+            # raspunsurile salvate cu alt backend de embeddings nu sunt comparabile
+            if len(blob) != dim * 4:
+                continue
+            entries.add(row_id, answer, created_at, np.frombuffer(blob, dtype=np.float32))
+        self._hot[scope] = entries
+        return entries
+
+    def _expire(self, entries: _ScopeEntries) -> None:
+        # intrarile sunt in ordinea crearii, deci cele expirate sunt la inceput
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        while expired < len(entries.created_at) and entries.created_at[expired] < cutoff:
+            expired += 1
+        entries.drop_first(expired)
+
+    def get_answer(
+        self, question: str, embedding: Sequence[float], scope: str = "general"
+    ) -> Optional[str]:
+        query = _unit(embedding)
+        with self._lock:
+            entries = self._load_scope(scope, query.shape[0])
+            self._expire(entries)
+            if entries.matrix is None:
+                return None
+            sims = entries.matrix @ query
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                return None
+            logger.debug(
+                f"Answer cache hit in {scope} for '{question}' (similarity {float(sims[best]):.3f})"
+            )
+            return entries.answers[best]
+
+    def get_exact(self, question: str, scope: str = "general") -> Optional[str]:
+        "Answer saved for the same question text (case and spacing ignored), no embedding needed"
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT answer FROM qa_answers
+                WHERE scope = ? AND question = ? AND created_at >= ?
+                ORDER BY created_at DESC LIMIT 1
+                """,
+                (scope, _question_key(question), time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            return None
+        logger.debug(f"Answer cache exact hit in {scope} for '{question}'")
+        return row[0]
+
+    def save_qa(
+        self,
+        question: str,
+        answer: str,
+        embedding: Optional[Sequence[float]],
+        scope: str = "general",
+    ) -> None:
+        "Without an embedding (fast path) the answer is only found by get_exact"
+        vector = _unit(embedding) if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO qa_answers(scope, question, answer, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    scope,
+                    _question_key(question),
+                    answer,
+                    vector.tobytes() if vector is not None else b"",
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM qa_answers WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            # se cauta doar in cele mai noi hot_items, restul n-ar mai fi gasite niciodata
+            trimmed = {
+                row[0]
+                for row in self._conn.execute(
+                    """
+                    SELECT id FROM qa_answers WHERE scope = ? AND id NOT IN (
+                        SELECT id FROM qa_answers WHERE scope = ?
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    )
+                    """,
+                    (scope, scope, self.hot_items),
+                )
+            }
+            self._conn.executemany(
+                "DELETE FROM qa_answers WHERE id = ?", [(row_id,) for row_id in trimmed]
+            )
+            self._conn.commit()
+            # tier-ul din memorie pierde exact aceleasi randuri
+            hot = self._hot.get(scope)
+            if hot is not None and trimmed:
+                hot.discard(trimmed)
+            if vector is None:
+                return
+            entries = self._load_scope(scope, vector.shape[0])
+            if not entries.ids or entries.ids[-1] != cur.lastrowid:
+                entries.add(cur.lastrowid, answer, now, vector)  # type: ignore
+            entries.drop_first(len(entries.ids) - self.hot_items)
+
+    def invalidate(self, scope: str) -> None:
+        "Forget every answer of a scope (its collection was re-indexed)"
+        with self._lock:
+            self._conn.execute("DELETE FROM qa_answers WHERE scope = ?", (scope,))
+            self._conn.commit()
+            self._hot.pop(scope, None)
+        logger.debug(f"Answer cache invalidated for {scope}")
+
+
+qa_store = QAStore(
+    db_path=settings.ANSWER_CACHE_PATH,
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    hot_items=settings.ANSWER_CACHE_HOT_ITEMS,
+)
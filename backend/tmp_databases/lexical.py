@@ -0,0 +1,222 @@
+# lexical.py - persistent BM25 index kept next to every Chroma collection
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from .page_index import normalize_text
+
+LEXICAL_DB_PATH = os.path.join(os.getcwd(), "lexical.db")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# cuvintele de legatura apar peste tot si doar dilueaza scorul
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "if", "in", "is", "it", "my", "of", "on", "or", "the",
+    "to", "what", "when", "which", "who", "why", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    "Lowercased word tokens; codes and years ('mtp', 'rca', '2024') are kept as-is"
+    return [
+        t
+        for t in _TOKEN_RE.findall(normalize_text(text))
+        if t not in _STOPWORDS and (len(t) >= 2 or t.isdigit())
+    ]
+
+
+class LexicalIndex:
+    """
+    BM25 over the chunks of each collection: documents with their length and
+    metadata, plus postings term -> (doc, tf). Per-collection statistics (N,
+    average length) are cached in memory and dropped on every write.
+    """
+
+    def __init__(self, db_path: str = LEXICAL_DB_PATH) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._stats: dict[str, tuple[int, float]] = {}
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS lex_docs (
+                    collection TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    source TEXT,
+                    page INTEGER,
+                    PRIMARY KEY (collection, id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS lex_postings (
+                    collection TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (collection, term, id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ix_lex_postings_doc ON lex_postings(collection, id);
+                """
+            )
+            self._conn.commit()
+
+    def has_collection(self, collection: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM lex_docs WHERE collection = ? LIMIT 1", (collection,)
+            ).fetchone()
+        return row is not None
+
+    def add(
+        self,
+        collection: str,
+        docs: Iterable[tuple[str, str, Optional[dict[str, Any]]]],
+    ) -> int:
+        "Insert or replace (id, text, metadata) documents; returns how many were written"
+        rows = []
+        for doc_id, text, meta in docs:
+            meta = meta or {}
+            tf = Counter(tokenize(text))
+            rows.append((doc_id, text, meta.get("source"), meta.get("page"), tf))
+        with self._lock:
+            for doc_id, text, source, page, tf in rows:
+                self._delete(collection, [doc_id])
+                self._conn.execute(
+                    "INSERT INTO lex_docs (collection, id, length, text, source, page) VALUES (?, ?, ?, ?, ?, ?)",
+                    (collection, doc_id, sum(tf.values()), text, source, page),
+                )
+                self._conn.executemany(
+                    "INSERT INTO lex_postings (collection, term, id, tf) VALUES (?, ?, ?, ?)",
+                    [(collection, term, doc_id, n) for term, n in tf.items()],
+                )
+            self._conn.commit()
+            self._stats.pop(collection, None)
+        return len(rows)
+
+    def _delete(self, collection: str, ids: list[str]) -> None:
+        placeholders = ",".join("?" * len(ids))
+        self._conn.execute(
+            f"DELETE FROM lex_postings WHERE collection = ? AND id IN ({placeholders})",
+            (collection, *ids),
+        )
+        self._conn.execute(
+            f"DELETE FROM lex_docs WHERE collection = ? AND id IN ({placeholders})",
+            (collection, *ids),
+        )
+
+    def remove(self, collection: str, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._delete(collection, ids)
+            self._conn.commit()
+            self._stats.pop(collection, None)
+
+    def drop(self, collection: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM lex_postings WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM lex_docs WHERE collection = ?", (collection,))
+            self._conn.commit()
+            self._stats.pop(collection, None)
+
+    def _collection_stats(self, collection: str) -> tuple[int, float]:
+        stats = self._stats.get(collection)
+        if stats is None:
+            n, avg = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM lex_docs WHERE collection = ?",
+                (collection,),
+            ).fetchone()
+            stats = self._stats[collection] = (n, avg or 0.0)
+        return stats
+
+    def search(self, collection: str, query: str, k: int) -> list[dict[str, Any]]:
+        """
+        Top k documents by BM25. Each hit: {"id", "text", "source", "page"
+        (as stored, 0-based), "score", "matched" (query terms it contains),
+        "terms" (distinct query terms)}.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            n_docs, avg_len = self._collection_stats(collection)
+            if not n_docs:
+                return []
+            postings = self._conn.execute(
+                f"""
+                SELECT p.term, p.id, p.tf, d.length FROM lex_postings p
+                JOIN lex_docs d ON d.collection = p.collection AND d.id = p.id
+                WHERE p.collection = ? AND p.term IN ({placeholders})
+                """,
+                (collection, *terms),
+            ).fetchall()
+
+        df = Counter(term for term, _, _, _ in postings)
+        scores: dict[str, float] = {}
+        matched: Counter = Counter()
+        for term, doc_id, tf, length in postings:
+            idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_len or 1))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            matched[doc_id] += 1
+
+        top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        if not top:
+            return []
+        ids = [doc_id for doc_id, _ in top]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, source, page FROM lex_docs WHERE collection = ? AND id IN ({','.join('?' * len(ids))})",
+                (collection, *ids),
+            ).fetchall()
+        docs = {r[0]: r for r in rows}
+        return [
+            {
+                "id": doc_id,
+                "text": docs[doc_id][1],
+                "source": docs[doc_id][2],
+                "page": docs[doc_id][3],
+                "score": score,
+                "matched": matched[doc_id],
+                "terms": len(terms),
+            }
+            for doc_id, score in top
+            if doc_id in docs
+        ]
+
+
+def is_decisive(hits: list[dict[str, Any]], ratio: float) -> bool:
+    """
+    The lexical answer is trusted on its own when the best document contains
+    every query term and scores clearly above the runner-up.
+    """
+    if not hits or hits[0]["matched"] < hits[0]["terms"]:
+        return False
+    if len(hits) == 1:
+        return True
+    return hits[0]["score"] >= ratio * hits[1]["score"]
+
+
+def rrf_fuse(rankings: Iterable[list[str]], k: int, rrf_k: int = 60) -> list[tuple[str, float]]:
+    "Reciprocal rank fusion of several ranked id lists; returns the top k (id, score)"
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,183 @@
+# page_index.py - persistent per-page text store for citation lookup
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+import PyPDF2
+from loguru import logger
+
+PAGES_DB_PATH = os.path.join(os.getcwd(), "pages.db")
+
+# cuvinte scurte / foarte frecvente nu ajuta la filtrare in indexul inversat
+_MIN_TERM_LEN = 3
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(s: str) -> str:
+    # Normalize Unicode, replace NBSP with space, collapse whitespace, lowercase
+    s = unicodedata.normalize("NFKC", s or "")
+    s = s.replace("\u00a0", " ")  # NBSP -> space
+    s = s.replace("\u200b", "")  # zero-width space
+    s = re.sub(r"\s+", " ", s)  # collapse all whitespace
+    return s.strip().lower()
+
+
+def _terms(norm_text: str) -> set[str]:
+    return {t for t in _TERM_RE.findall(norm_text) if len(t) >= _MIN_TERM_LEN}
+
+
+def _key(path: Union[str, Path]) -> str:
+    return str(Path(path).resolve())
+
+
+class PageStore:
+    """
+    Pages of every ingested pdf, normalized once at ingest time, plus an
+    inverted index term -> pages so an anchor lookup never re-parses a pdf.
+    """
+
+    def __init__(self, db_path: str = PAGES_DB_PATH) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    UNIQUE(path, page)
+                );
+                CREATE TABLE IF NOT EXISTS page_terms (
+                    term TEXT NOT NULL,
+                    page_id INTEGER NOT NULL,
+                    PRIMARY KEY (term, page_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ix_page_terms_page_id ON page_terms(page_id);
+                """
+            )
+            self._conn.commit()
+
+    def has_file(self, path: Union[str, Path]) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM pages WHERE path = ? LIMIT 1", (_key(path),)
+            ).fetchone()
+        return row is not None
+
+    def index_pages(self, path: Union[str, Path], pages: Iterable[str]) -> int:
+        """
+        Replace the stored pages of `path` with `pages` (in order, page 1 first).
+        Returns the number of pages indexed.
+        """
+        path = _key(path)
+        rows = [(n, normalize_text(raw)) for n, raw in enumerate(pages, start=1)]
+        with self._lock:
+            self.remove_file(path, _locked=True)
+            for page_number, norm in rows:
+                cur = self._conn.execute(
+                    "INSERT INTO pages (path, page, text) VALUES (?, ?, ?)",
+                    (path, page_number, norm),
+                )
+                page_id = cur.lastrowid
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO page_terms (term, page_id) VALUES (?, ?)",
+                    [(t, page_id) for t in _terms(norm)],
+                )
+            self._conn.commit()
+        logger.debug(f"Indexed {len(rows)} pages of {path} in the page store")
+        return len(rows)
+
+    def index_pdf(self, path: Union[str, Path]) -> int:
+        "Extract the pages of a pdf from disk (used for files ingested before the store existed)"
+        reader = PyPDF2.PdfReader(str(path))
+        pages = []
+        for page in reader.pages:
+            try:
+                pages.append(page.extract_text() or "")
+            except Exception:
+                pages.append("")
+        return self.index_pages(path, pages)
+
+    def remove_file(self, path: Union[str, Path], _locked: bool = False) -> None:
+        def _remove() -> None:
+            self._conn.execute(
+                "DELETE FROM page_terms WHERE page_id IN (SELECT id FROM pages WHERE path = ?)",
+                (_key(path),),
+            )
+            self._conn.execute("DELETE FROM pages WHERE path = ?", (_key(path),))
+
+        if _locked:
+            _remove()
+            return
+        with self._lock:
+            _remove()
+            self._conn.commit()
+
+    def find(
+        self, anchor: str, under: Optional[Path] = None
+    ) -> Tuple[Union[Path, None], int]:
+        """
+        Returns (pdf_path, 1-based page_number) of the first page containing the
+        normalized `anchor`, or (None, -1).
+        """
+        norm_anchor = normalize_text(anchor)
+        if not norm_anchor:
+            return None, -1
+
+        terms = sorted(_terms(norm_anchor))
+        with self._lock:
+            if terms:
+                # paginile care contin toti termenii ancorei, apoi verificare exacta
+                placeholders = ",".join("?" * len(terms))
+                rows = self._conn.execute(
+                    f"""
+                    SELECT p.path, p.page, p.text FROM pages p
+                    JOIN (
+                        SELECT page_id FROM page_terms
+                        WHERE term IN ({placeholders})
+                        GROUP BY page_id
+                        HAVING COUNT(*) = ?
+                    ) m ON m.page_id = p.id
+                    ORDER BY p.path, p.page
+                    """,
+                    (*terms, len(terms)),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT path, page, text FROM pages ORDER BY path, page"
+                ).fetchall()
+
+        root = under.resolve() if under is not None else None
+        for path, page, text in rows:
+            if root is not None and root not in Path(path).parents:
+                continue
+            if norm_anchor in text:
+                return Path(path), page
+        return None, -1
+
+
+page_store = PageStore()
+
+
+def index_missing_pdfs(directory_pdfs: Path) -> int:
+    "Backfill the store with pdfs from `directory_pdfs` that were never indexed"
+    count = 0
+    for file in directory_pdfs.glob("*.pdf"):
+        if page_store.has_file(file):
+            continue
+        try:
+            page_store.index_pdf(file)
+            count += 1
+        except Exception as e:
+            logger.warning(f"Could not index {file} in the page store: {e}")
+    return count
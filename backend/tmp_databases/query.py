@@ -1,55 +1,142 @@
-from typing import Union
-import chromadb
+from typing import Any, Literal, Optional, Sequence, Union
+import asyncio
+import hashlib
+import heapq
 import re
 import os
-from langchain_openai import OpenAIEmbeddings
 from pathlib import Path
-from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from loguru import logger
-from chromadb.utils import embedding_functions
+from ..chroma_registry import chroma
 from ..config import settings
+from ..embedding_cache import aembed_query, embed_query
+from ..embeddings import embedding_backend
+from ..vector_index import vector_tier
+from .page_index import page_store
+from .cache import qa_store
+from .lexical import is_decisive, lexical_index, rrf_fuse
 
-client = chromadb.PersistentClient("./db/")
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=settings.OPENAI_API_KEY,
-    model_name=settings.OPENAI_MODEL_NAME_EMBEDDING,
-)
-embeddings = OpenAIEmbeddings(
-    model=settings.OPENAI_MODEL_NAME_EMBEDDING,  # "text-embedding-3-small"
-    api_key=settings.OPENAI_API_KEY,  # type: ignore
-)
+
+
+INSURANCE_PDF = "./tmp_databases/Insurance.pdf"
+INSURANCE_COLLECTION = "insurance_docs"
+
+
+def reset_collection(collection_name: str) -> None:
+    """
+    Empty the collection for the current embedding backend, with everything
+    derived from its chunks: BM25 index, in-memory vectors and cached answers.
+    Only for an explicit re-seed / re-ingest after EMBEDDING_BACKEND changed.
+    """
+    logger.warning(f"Rebuilding {collection_name} for {embedding_backend().id}")
+    chroma.rebuild(collection_name)
+    lexical_index.drop(collection_name)
+    vector_tier.refresh(collection_name)
+    qa_store.invalidate(collection_name)
 
 
 def populate_db_tmp():
-    lst = []
-    abs_path = os.path.abspath("./tmp_databases/Insurance.pdf")
-    lst.append(abs_path)
-    add_pdfs(lst, "insurance_docs")
+    "Seed Insurance.pdf; re-running it only replaces the chunks that changed"
+    if chroma.is_stale(INSURANCE_COLLECTION):
+        reset_collection(INSURANCE_COLLECTION)
+    abs_path = os.path.abspath(INSURANCE_PDF)
+    _, chunked_documents = load_pdf_chunks(abs_path)
+    ids, embedded = add_chunks(chunked_documents, INSURANCE_COLLECTION)
+    removed = remove_stale_chunks(INSURANCE_COLLECTION, abs_path, set(ids))
+    qa_store.invalidate(INSURANCE_COLLECTION)
+    logger.debug(
+        f"Seeded {INSURANCE_COLLECTION}: {len(ids)} chunks, {embedded} embedded, {removed} removed"
+    )
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+
+def load_pdf_chunks(file_path: Union[str, Path]) -> tuple[int, list[Document]]:
+    """
+    Parse one pdf: its pages go to the page store (for citations) and the
+    text is split into chunks ready to embed. Returns (pages, chunks).
+    """
+    loader = PyPDFLoader(str(file_path))
+    document = loader.load()
+    # textul paginilor e extras o singura data aici, pentru citari
+    pages = sorted(document, key=lambda d: d.metadata.get("page", 0))
+    page_store.index_pages(file_path, [d.page_content for d in pages])
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+    return len(pages), text_splitter.split_documents(document)
+
+
+def chunk_id(doc: Document) -> str:
+    "Content address of a chunk: unchanged text keeps its id (and its embedding)"
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def add_chunks(chunked_documents: list[Document], collection_name: str) -> tuple[list[str], int]:
+    """
+    Upsert the chunks into the collection (created if missing). Only chunks
+    whose content hash is not already stored get embedded; the others just
+    get their metadata (source/page) refreshed. Returns (chunk ids, embedded).
+    """
+    collection = chroma.get_or_create(collection_name)
+    unique: dict[str, Document] = {}
+    for doc in chunked_documents:
+        unique.setdefault(chunk_id(doc), doc)
+    ids = list(unique)
+    if not ids:
+        return [], 0
+
+    existing = set(collection.get(ids=ids, include=[])["ids"])
+    new_ids = [i for i in ids if i not in existing]
+    old_ids = [i for i in ids if i in existing]
+
+    if new_ids:
+        texts = [unique[i].page_content for i in new_ids]
+        collection.add(
+            ids=new_ids,
+            documents=texts,
+            metadatas=[unique[i].metadata for i in new_ids],
+            embeddings=embedding_backend().embed(texts),  # type: ignore
+        )
+    if old_ids:
+        collection.update(ids=old_ids, metadatas=[unique[i].metadata for i in old_ids])
+    # indexul lexical tine pasul cu colectia
+    lexical_index.add(
+        collection_name, [(i, unique[i].page_content, unique[i].metadata) for i in ids]
+    )
+    vector_tier.refresh(collection_name)
+    return ids, len(new_ids)
+
+
+def remove_stale_chunks(collection_name: str, source: str, keep_ids: set[str]) -> int:
+    "Drop the chunks of `source` that are not part of its latest revision"
+    collection = chroma.get(collection_name)
+    stored = collection.get(where={"source": source}, include=[])["ids"]
+    stale = [i for i in stored if i not in keep_ids]
+    if stale:
+        collection.delete(ids=stale)
+        lexical_index.remove(collection_name, stale)
+        vector_tier.refresh(collection_name)
+    return len(stale)
 
 
 def add_pdfs(file_paths: list[Path], collection_name: str):
     "We take the pdfs paths, the collection name , and we populate chroma db"
     for file_path in file_paths:
-        loader = PyPDFLoader(file_path)
-        document = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=100
-        )
-        chunked_documents = text_splitter.split_documents(document)
-
-        Chroma.from_documents(
-            documents=chunked_documents,
-            embedding=embeddings,
-            collection_name=collection_name,
-            client=client,
-        )
+        _, chunked_documents = load_pdf_chunks(file_path)
+        add_chunks(chunked_documents, collection_name)
 
         logger.debug(
             f"Added {len(chunked_documents)} chunks to chroma db, in the collection_name {collection_name}"
         )
 
+    # raspunsurile vechi pot contrazice documentele noi
+    qa_store.invalidate(collection_name)
+
 
 HEADER_PATS = [
     re.compile(r"^\s*PHOTO\s*$", re.I),
@@ -79,25 +166,158 @@ def _clean_pdf_text(s: str) -> str:
     return s
 
 
-def query_db(
-    query: str, collection_name: str, k: int, join: bool = False
-) -> Union[list[str], str]:
-    "Take the query, collection_name and return top k number of results from the docs"
-    collection = client.get_collection(
-        name=collection_name,
-        embedding_function=openai_ef,  # type: ignore
-    )
+def search_collection(
+    collection_name: str, query_embedding: list[float], k: int
+) -> list[dict[str, Any]]:
+    """
+    Top k hits of one collection for an already computed query embedding.
+    Each hit carries the chunk text and where it came from:
+    {"text", "source", "page" (1-based, None if unknown), "id", "distance", "collection"}
+    """
+    index = vector_tier.get(collection_name)
+    if index is not None:
+        # colectiile mici si fierbinti sunt cautate direct in memorie
+        (top,) = index.search(query_embedding, k)  # type: ignore
+        return [
+            _vector_hit(index.ids[i], index.documents[i], index.metadatas[i], dist, collection_name)
+            for i, dist in top
+        ]
 
-    results = collection.query(
-        query_texts=[query],
-        n_results=k,
-        include=["documents"],
-    )
+    collection = chroma.get(collection_name)
+    try:
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+    except Exception:
+        # handle-ul poate fi vechi (colectie stearsa/recreata), il rezolvam din nou data viitoare
+        chroma.invalidate(collection_name)
+        raise
 
+    ids = results["ids"][0]
     raw_docs = results["documents"][0]  # type: ignore
-    cleaned = [_clean_pdf_text(d or "") for d in raw_docs]
+    metadatas = results["metadatas"][0]  # type: ignore
+    distances = results["distances"][0]  # type: ignore
+    return [
+        _vector_hit(doc_id, doc, meta, dist, collection_name)
+        for doc_id, doc, meta, dist in zip(ids, raw_docs, metadatas, distances)
+    ]
+
+
+def _vector_hit(
+    doc_id: str, doc: Optional[str], meta: Optional[dict], dist: float, collection_name: str
+) -> dict[str, Any]:
+    meta = meta or {}
+    page = meta.get("page")
+    return {
+        "text": _clean_pdf_text(doc or ""),
+        "source": meta.get("source"),
+        # PyPDFLoader numara paginile de la 0
+        "page": int(page) + 1 if page is not None else None,
+        "id": doc_id,
+        "distance": dist,
+        "collection": collection_name,
+    }
+
+
+RetrievalMode = Literal["vector", "hybrid", "fast"]
+
+
+def _lexical_hit(hit: dict[str, Any], collection_name: str) -> dict[str, Any]:
+    page = hit["page"]
+    return {
+        "text": _clean_pdf_text(hit["text"] or ""),
+        "source": hit["source"],
+        "page": int(page) + 1 if page is not None else None,
+        "id": hit["id"],
+        "distance": None,
+        "collection": collection_name,
+    }
+
+
+def retrieve(
+    query: str, collection_name: str, k: int, mode: RetrievalMode
+) -> list[dict[str, Any]]:
+    """
+    - vector: nearest chunks by embedding (one embedding call)
+    - hybrid: BM25 and vector candidates fused by reciprocal rank
+    - fast: BM25 only when its top hit is decisive (no embedding call),
+      hybrid otherwise
+    """
+    if mode == "vector":
+        return search_collection(collection_name, embed_query(query), k)
 
-    return " ".join(cleaned).strip() if join else cleaned
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    lexical = lexical_index.search(collection_name, query, candidates)
+    if mode == "fast" and is_decisive(lexical, settings.LEXICAL_DECISIVE_RATIO):
+        logger.debug(f"Lexical hit is decisive for '{query}', skipping the embedding")
+        return [_lexical_hit(h, collection_name) for h in lexical[:k]]
+
+    vector = search_collection(collection_name, embed_query(query), candidates)
+    if not lexical:
+        return vector[:k]
+    by_id = {h["id"]: _lexical_hit(h, collection_name) for h in lexical}
+    by_id.update({h["id"]: h for h in vector})
+    fused = rrf_fuse([[h["id"] for h in vector], [h["id"] for h in lexical]], k)
+    return [{**by_id[doc_id], "score": score} for doc_id, score in fused]
+
+
+def query_db(
+    query: str,
+    collection_name: str,
+    k: int,
+    join: bool = False,
+    mode: Optional[RetrievalMode] = None,
+) -> Union[list[dict[str, Any]], str]:
+    "Take the query, collection_name and return top k hits from the docs"
+    hits = retrieve(query, collection_name, k, mode or settings.RETRIEVAL_MODE)  # type: ignore
+    return " ".join(h["text"] for h in hits).strip() if join else hits
+
+
+def build_lexical_index(collection_name: str, text_of=None) -> int:
+    """
+    (Re)build the BM25 index of a collection from what Chroma stores, for
+    collections ingested before the lexical index existed. `text_of(id, doc)`
+    picks the indexed text (default: the document).
+    """
+    stored = chroma.get(collection_name).get(include=["documents", "metadatas"])
+    entries = [
+        (doc_id, text_of(doc_id, doc) if text_of else (doc or ""), meta)
+        for doc_id, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])  # type: ignore
+    ]
+    lexical_index.drop(collection_name)
+    return lexical_index.add(collection_name, entries)
+
+
+async def query_many(
+    query: str, collection_names: Sequence[str], k: int
+) -> list[dict[str, Any]]:
+    """
+    Fan-out search: the query is embedded once, every collection is searched
+    concurrently and the hits are merged into one global top k by (vector)
+    distance.
+    A collection that is missing (e.g. a failed upload) is skipped.
+    """
+    names = list(dict.fromkeys(collection_names))
+    if not names:
+        return []
+    query_embedding = await aembed_query(query)
+    semaphore = asyncio.Semaphore(settings.QUERY_FANOUT_CONCURRENCY)
+
+    async def _search(name: str) -> list[dict[str, Any]]:
+        async with semaphore:
+            return await asyncio.to_thread(search_collection, name, query_embedding, k)
+
+    results = await asyncio.gather(*(_search(n) for n in names), return_exceptions=True)
+
+    hits: list[dict[str, Any]] = []
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"Skipping collection {name} in fan-out query: {result}")
+            continue
+        hits.extend(result)
+    return heapq.nsmallest(k, hits, key=lambda h: h["distance"])
 
 
 if __name__ == "__main__":
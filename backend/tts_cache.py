@@ -0,0 +1,145 @@
+# tts_cache.py - content-addressed cache of synthesized speech
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, Union
+
+from loguru import logger
+
+from . import providers
+from .config import settings
+
+TTS_VOICE = "alloy"  # options: alloy, echo, fable, onyx, nova, shimmer
+TTS_FORMAT = "mp3"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class TTSCache:
+    """
+    Audio files named by sha256(model, voice, format, text) in one directory.
+    A hit only touches the file's mtime, which is what the size-capped LRU
+    eviction orders by.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total = sum(f.stat().st_size for f in self._files())
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def key(model: str, voice: str, fmt: str, text: str) -> str:
+        raw = "\x00".join((model, voice, fmt, _normalize(text)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _files(self) -> list[Path]:
+        # fisierele .tmp sunt scrise chiar acum, nu le numaram si nu le stergem
+        return [f for f in self.directory.glob("*.*") if f.suffix != ".tmp"]
+
+    def _path(self, key: str, fmt: str) -> Path:
+        return self.directory / f"{key}.{fmt}"
+
+    def get(self, key: str, fmt: str) -> Union[Path, None]:
+        path = self._path(key, fmt)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, fmt: str, content: bytes) -> Path:
+        path = self._path(key, fmt)
+        tmp = path.with_suffix(f".{fmt}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(content)
+        with self._lock:
+            # o cheie rescrisa inlocuieste fisierul, nu se aduna de doua ori
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            self._total += len(content) - replaced
+            if self._total > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self) -> None:
+        files = sorted(self._files(), key=lambda f: f.stat().st_mtime)
+        # coboram la 90% din limita, cele mai vechi folosite pleaca primele
+        target = int(self.max_bytes * 0.9)
+        for f in files:
+            if self._total <= target:
+                break
+            try:
+                size = f.stat().st_size
+                f.unlink()
+            except FileNotFoundError:
+                continue
+            self._total -= size
+        logger.debug(f"TTS cache evicted down to {self._total} bytes")
+
+    async def speech_path(
+        self, text: str, voice: str = TTS_VOICE, fmt: str = TTS_FORMAT
+    ) -> Path:
+        "Path of the audio for `text`, synthesized only the first time it is asked for"
+        key = self.key(settings.OPENAI_MODEL_NAME_TTS, voice, fmt, text)
+        path = self.get(key, fmt)
+        if path is not None:
+            return path
+
+        # aceeasi fraza ceruta de doua apeluri simultan se sintetizeaza o data
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._synthesize(key, text, voice, fmt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _synthesize(self, key: str, text: str, voice: str, fmt: str) -> Path:
+        content = await providers.synthesize_speech(text, voice=voice, response_format=fmt)
+        path = await asyncio.to_thread(self.put, key, fmt, content)
+        logger.debug(f"Saved TTS audio to: {path}")
+        return path
+
+    async def speech_bytes(
+        self, text: str, voice: str = TTS_VOICE, fmt: str = TTS_FORMAT
+    ) -> bytes:
+        path = await self.speech_path(text, voice, fmt)
+        return await asyncio.to_thread(path.read_bytes)
+
+
+tts_cache = TTSCache(Path(settings.TTS_CACHE_DIR), settings.TTS_CACHE_MAX_BYTES)
+
+
+async def warm_up(phrases: Iterable[str]) -> int:
+    "Pre-render `phrases`; returns how many were rendered (or already cached)"
+    phrases = list(phrases)
+    results = await asyncio.gather(
+        *(tts_cache.speech_path(p) for p in phrases), return_exceptions=True
+    )
+    for phrase, result in zip(phrases, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"TTS warm-up failed for '{phrase}': {result}")
+    return sum(not isinstance(r, BaseException) for r in results)
+
+
+if __name__ == "__main__":
+    # python -m backend.tts_cache "phrase" ...
+    async def _main() -> None:
+        try:
+            count = await warm_up(sys.argv[1:])
+            logger.info(f"Warmed {count} phrases into {tts_cache.directory}")
+        finally:
+            await providers.aclose()
+
+    asyncio.run(_main())
@@ -0,0 +1,198 @@
+# vector_index.py - in-memory exact search for the small, hot collections
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+from loguru import logger
+
+from .chroma_registry import chroma
+from .config import settings
+from .embeddings import embedding_backend
+
+# randuri int8 convertite odata, ca sa nu dublam memoria economisita
+_BLOCK_ROWS = 1024
+
+
+class VectorIndex:
+    """
+    The vectors of one collection as a single matrix (float32, or int8 with a
+    scale per row), searched exactly with one matrix product. Distances are
+    squared L2, the same as Chroma's default space, so hits from both paths
+    compare. Documents and metadata are kept alongside to build hits without
+    touching Chroma.
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict[str, Any]],
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+    ) -> None:
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.vectors = vectors
+        self.scales = scales
+        norms = [np.einsum("ij,ij->i", block, block) for _, block in self._blocks()]
+        self.sq_norms = np.concatenate(norms) if norms else np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def build(
+        cls,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict[str, Any]],
+        embeddings: Sequence[Sequence[float]],
+        quantization: str,
+    ) -> "VectorIndex":
+        if not ids:
+            return cls([], [], [], np.zeros((0, 0), dtype=np.float32))
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        if quantization != "int8":
+            return cls(ids, documents, metadatas, matrix)
+        # cuantizare simetrica pe rand: x ~ scale * q, q in [-127, 127]
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+        return cls(ids, documents, metadatas, quantized, scales.astype(np.float32))
+
+    def _blocks(self):
+        "(first row, dequantized float32 rows) in blocks of _BLOCK_ROWS"
+        for start in range(0, len(self.ids), _BLOCK_ROWS):
+            block = np.asarray(self.vectors[start : start + _BLOCK_ROWS], dtype=np.float32)
+            if self.scales is not None:
+                block = block * self.scales[start : start + _BLOCK_ROWS, None]
+            yield start, block
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, queries: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        "Top k (row, squared L2 distance) for each query row of `queries` (m x d)"
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not len(self.ids):
+            return [[] for _ in range(len(queries))]
+        if self.scales is None:
+            dots = queries @ np.asarray(self.vectors).T
+        else:
+            dots = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+            for start, block in self._blocks():
+                dots[:, start : start + len(block)] = queries @ block.T
+        distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, None] + self.sq_norms[None, :] - 2 * dots
+        )
+        k = min(k, len(self.ids))
+        results = []
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k]
+            top = top[np.argsort(row[top])]
+            results.append([(int(i), float(max(row[i], 0.0))) for i in top])
+        return results
+
+
+class VectorIndexTier:
+    """
+    Hot collections (settings.VECTOR_INDEX_COLLECTIONS) mirrored from Chroma
+    into memory. Each is saved as .npy files and opened memory-mapped at
+    startup; after a write to Chroma the collection is refreshed from it, so
+    the mirror never drifts. Collections not loaded fall back to Chroma.
+    """
+
+    def __init__(self, directory: Path, collections: Sequence[str], quantization: str) -> None:
+        self.directory = directory
+        self.collections = set(collections)
+        self.quantization = quantization
+        self._indexes: dict[str, VectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def is_hot(self, name: str) -> bool:
+        return name in self.collections
+
+    def get(self, name: str) -> Union[VectorIndex, None]:
+        return self._indexes.get(name)
+
+    def _files(self, name: str) -> tuple[Path, Path, Path]:
+        base = self.directory / name
+        return base.with_suffix(".npy"), base.with_suffix(".scales.npy"), base.with_suffix(".json")
+
+    def _save(self, name: str, index: VectorIndex) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors_path, scales_path, manifest_path = self._files(name)
+        for path, array in ((vectors_path, index.vectors), (scales_path, index.scales)):
+            if array is None:
+                continue
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(f"{path}.tmp", path)
+        manifest = {
+            "backend": embedding_backend().id,
+            "quantization": self.quantization,
+            "ids": index.ids,
+            "documents": index.documents,
+            "metadatas": index.metadatas,
+        }
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _open(self, name: str, expected: int) -> Union[VectorIndex, None]:
+        "The saved index, memory-mapped, if it still matches the collection"
+        vectors_path, scales_path, manifest_path = self._files(name)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (
+                manifest["backend"] != embedding_backend().id
+                or manifest["quantization"] != self.quantization
+                or len(manifest["ids"]) != expected
+            ):
+                return None
+            vectors = np.load(vectors_path, mmap_mode="r")
+            scales = np.load(scales_path) if self.quantization == "int8" else None
+        except (OSError, ValueError, KeyError):
+            return None
+        return VectorIndex(manifest["ids"], manifest["documents"], manifest["metadatas"], vectors, scales)
+
+    def refresh(self, name: str) -> None:
+        "Rebuild `name` from Chroma (after a write); no-op for collections that are not hot"
+        if not self.is_hot(name):
+            return
+        stored = chroma.get(name).get(include=["documents", "metadatas", "embeddings"])
+        index = VectorIndex.build(
+            list(stored["ids"]),
+            [d or "" for d in stored["documents"]],  # type: ignore
+            [m or {} for m in stored["metadatas"]],  # type: ignore
+            stored["embeddings"],  # type: ignore
+            self.quantization,
+        )
+        with self._lock:
+            self._save(name, index)
+            self._indexes[name] = index
+        logger.debug(f"Vector index of {name} rebuilt: {len(index)} vectors ({self.quantization})")
+
+    def load_all(self) -> None:
+        "Open every hot collection, rebuilding from Chroma the ones whose files are stale"
+        for name in self.collections:
+            try:
+                expected = chroma.get(name).count()
+                index = self._open(name, expected)
+                if index is None:
+                    self.refresh(name)
+                    continue
+                with self._lock:
+                    self._indexes[name] = index
+                logger.debug(f"Vector index of {name} loaded: {len(index)} vectors")
+            except Exception as e:
+                logger.warning(f"Vector index of {name} not loaded, using Chroma: {e}")
+
+
+vector_tier = VectorIndexTier(
+    Path(settings.VECTOR_INDEX_DIR),
+    settings.VECTOR_INDEX_COLLECTIONS if settings.VECTOR_INDEX_ENABLED else [],
+    settings.VECTOR_INDEX_QUANTIZATION,
+)
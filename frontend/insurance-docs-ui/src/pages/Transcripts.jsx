@@ -157,6 +157,7 @@ export default function Transcripts() {
   const [conversations, setConversations] = useState([]);
   const [error, setError] = useState("");
   const [expanded, setExpanded] = useState({}); // { [conv.id]: boolean }
+  const [nextCursor, setNextCursor] = useState(null);
 
   const [hoverFetch, setHoverFetch] = useState(false);
 
@@ -191,10 +192,26 @@ export default function Transcripts() {
     e?.preventDefault?.();
     setError("");
     setConversations([]);
+    setNextCursor(null);
     setLoading(true);
     try {
       const data = await fetchConversationsByPhone(phone.trim());
-      setConversations(Array.isArray(data) ? data : []);
+      setConversations(Array.isArray(data.conversations) ? data.conversations : []);
+      setNextCursor(data.nextCursor);
+    } catch (err) {
+      setError(err?.message || "Failed to fetch conversations");
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const loadMore = async () => {
+    setError("");
+    setLoading(true);
+    try {
+      const data = await fetchConversationsByPhone(phone.trim(), nextCursor);
+      setConversations((prev) => [...prev, ...(data.conversations || [])]);
+      setNextCursor(data.nextCursor);
     } catch (err) {
       setError(err?.message || "Failed to fetch conversations");
     } finally {
@@ -285,6 +302,16 @@ export default function Transcripts() {
                 </div>
               );
             })}
+            {nextCursor && (
+              <button
+                type="button"
+                onClick={loadMore}
+                disabled={loading}
+                style={{ ...buttonStyles, justifySelf: "start" }}
+              >
+                {loading ? "Loading..." : "Load more"}
+              </button>
+            )}
           </div>
         )}
       </SectionCard>
@@ -1,8 +1,13 @@
 // src/utils/conversationService.js
 const API = process.env.REACT_APP_API_BASE || "http://127.0.0.1:8000";
 
-export async function fetchConversationsByPhone(phone) {
-  const res = await fetch(`${API}/conv`, {
+const PAGE_SIZE = 50;
+
+// one page of conversations, newest first; pass nextCursor back to get the following page
+export async function fetchConversationsByPhone(phone, cursor = null) {
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  if (cursor) params.set("cursor", cursor);
+  const res = await fetch(`${API}/conv?${params}`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ text: phone }),
@@ -12,5 +17,6 @@ export async function fetchConversationsByPhone(phone) {
     const text = await res.text().catch(() => "");
     throw new Error(text || `Failed to fetch conversations (status ${res.status})`);
   }
-  return res.json();
+  const conversations = await res.json();
+  return { conversations, nextCursor: res.headers.get("X-Next-Cursor") };
 }
@@ -0,0 +1,51 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+from fastapi import FastAPI
+
+"""
+
+Backend and telephony in one process: the Twilio routes are mounted on the
+backend app, and /rsp, /rsp_db and /stop_call are awaited directly instead of
+going out and back in through the ngrok tunnel.
+
+Run from the backend directory (its data files are relative to the cwd):
+    uvicorn combined:app --app-dir ../telephony --port 8080
+
+"""
+
+# pachetul backend e in radacina repo-ului
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.main import app, lifespan as backend_lifespan, response_from_llm, rsp_db, stop_call  # noqa: E402
+from backend.models import QueryRequest, TextRequest  # noqa: E402
+from routes import backend_client  # noqa: E402
+from routes.routes import router  # noqa: E402
+
+
+async def _rsp(payload: dict[str, Any]) -> dict[str, Any]:
+    return (await response_from_llm(TextRequest(**payload))).model_dump()
+
+
+async def _rsp_db(payload: dict[str, Any]) -> dict[str, Any]:
+    return (await rsp_db(QueryRequest(**payload))).model_dump()
+
+
+async def _stop_call(payload: dict[str, Any]) -> dict[str, Any]:
+    return (await stop_call(TextRequest(**payload))).model_dump()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with backend_lifespan(app):
+        # clientul http ramane pentru apelurile externe (glume)
+        await backend_client.start()
+        yield
+        await backend_client.close()
+
+
+backend_client.use_in_process({"/rsp": _rsp, "/rsp_db": _rsp_db, "/stop_call": _stop_call})
+app.router.lifespan_context = lifespan
+app.include_router(router)
@@ -1,5 +1,17 @@
+from contextlib import asynccontextmanager
+
 from  fastapi import FastAPI
+from routes import backend_client
 from routes.routes import router
 
-app = FastAPI()
-app.include_router(router)
\ No newline at end of file
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # un singur client http, conexiunile raman deschise intre apeluri
+    await backend_client.start()
+    yield
+    await backend_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(router)
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+
+"""
+
+One HTTP client for the whole telephony app, opened in the app lifespan.
+Connections to the backend (and the jokes API) are kept alive and reused over
+HTTP/2, so a turn no longer pays a TCP + TLS handshake through the tunnel.
+
+Every backend route has a time budget: the whole call, retries included, has to
+fit in it, so Twilio gets its TwiML back before the caller hears dead air.
+Retries only happen when the connection could not be opened (the request never
+reached the backend), so a turn is never answered or saved twice.
+
+When the backend runs in the same process (combined.py), its routes are
+registered with `use_in_process` and called directly, with the same budgets.
+
+"""
+
+
+load_dotenv()
+BASE_URL = os.getenv("BACKEND_URL", 'https://802126f966c4.ngrok-free.app')
+
+# secunde, tot apelul (cu retry-uri cu tot)
+TIMEOUT_BUDGETS: dict[str, float] = {
+    "/rsp": 8.0,
+    "/rsp_db": 10.0,
+    "/stop_call": 5.0,
+}
+DEFAULT_BUDGET = 8.0
+CONNECT_TIMEOUT = 2.0
+CONNECT_RETRIES = 2
+
+Handler = Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]
+
+_client: Optional[httpx.AsyncClient] = None
+_in_process: dict[str, Handler] = {}
+
+
+# turele in-process inca pornite, si cele abandonate dupa buget
+_in_flight: set[asyncio.Task] = set()
+
+
+def _in_process_done(task: asyncio.Task) -> None:
+    _in_flight.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print("In-process backend call failed:", repr(task.exception()))
+
+
+def use_in_process(handlers: dict[str, Handler]) -> None:
+    "Serve these backend routes with local coroutines instead of HTTP"
+    _in_process.update(handlers)
+
+
+def _new_client() -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=CONNECT_RETRIES,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(DEFAULT_BUDGET, connect=CONNECT_TIMEOUT),
+    )
+
+
+async def start() -> None:
+    global _client
+    if _client is None:
+        _client = _new_client()
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def client() -> httpx.AsyncClient:
+    # pornit din lifespan; daca nu (ex. router montat in alta aplicatie), il cream la prima cerere
+    global _client
+    if _client is None:
+        _client = _new_client()
+    return _client
+
+
+async def post_backend(path: str, payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    POST `payload` to the backend route `path` and return the JSON body.
+    Raises on errors, non-JSON bodies and when the route's budget runs out.
+    """
+    budget = TIMEOUT_BUDGETS.get(path, DEFAULT_BUDGET)
+    handler = _in_process.get(path)
+    if handler is not None:
+        # shield: peste buget raspundem fara el, dar tura se termina si se salveaza (ca prin http)
+        task = asyncio.ensure_future(handler(payload))
+        _in_flight.add(task)
+        task.add_done_callback(_in_process_done)
+        return await asyncio.wait_for(asyncio.shield(task), timeout=budget)
+    res = await asyncio.wait_for(
+        client().post(f"{BASE_URL}{path}", json=payload, timeout=httpx.Timeout(budget, connect=CONNECT_TIMEOUT)),
+        timeout=budget,
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+async def get_json(url: str, timeout: float = 3.0, **kwargs: Any) -> dict[str, Any]:
+    res = await client().get(url, timeout=timeout, **kwargs)
+    res.raise_for_status()
+    return res.json()
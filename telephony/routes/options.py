@@ -1,15 +1,15 @@
+import asyncio
 import os
 import re
-from fastapi import FastAPI, Request, Form, APIRouter
+from fastapi import FastAPI, Request, Form, APIRouter, Query
 from fastapi.responses import PlainTextResponse
-import httpx
 from dotenv import load_dotenv
 from twilio.twiml.voice_response import VoiceResponse,  Gather
 from twilio.rest import Client
+from .backend_client import get_json, post_backend
 
 
 router = APIRouter()
-BASE_URL = 'https://802126f966c4.ngrok-free.app'
 
 
 """
@@ -25,15 +25,12 @@ returns:
 """
 
 
-message_case : int = 0
-
 @router.post("/handle-intent-general", response_class=PlainTextResponse)
-async def handle_intent_general(SpeechResult:str = Form(None)) -> PlainTextResponse:
-    global message_case
+async def handle_intent_general(SpeechResult:str = Form(None), CallSid:str = Form(None), asked:int = Query(0)) -> PlainTextResponse:
     message : str = ''
     resp = VoiceResponse()
 
-    gather = Gather(input="dtmf speech", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
+    gather = Gather(input="dtmf speech", action="/handle-intent-general?asked=1", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
 
     data = {}
 
@@ -41,31 +38,27 @@ async def handle_intent_general(SpeechResult:str = Form(None)) -> PlainTextRespo
         print("SpeechResult:", SpeechResult)
 
         try:
-            async with httpx.AsyncClient() as client:
-                res = await client.post(
-                    f"{BASE_URL}/rsp",
-                    json={
-                        "text": SpeechResult,
-                        },
-                        timeout=10
-                )
-                data = res.json()
+            data = await post_backend(
+                "/rsp",
+                {
+                    "text": SpeechResult,
+                    "call_sid": CallSid,
+                },
+            )
         except Exception as e:
-            body_preview = (res.text[:500] if "res" in locals() and hasattr(res, "text") else str(e))
-            print("Backend error or non-JSON response:", body_preview)
+            print("Backend error or non-JSON response:", repr(e))
         
     reply = data.get('text', "Sorry, I didn't get a reply")
 
-    if message_case == 0:
+    if not asked:
         message = 'For general informations, you may state your question now'
-        message_case = 1
-    elif message_case == 1:
+    else:
         message = f'{reply}. Do you need anything else? If not, you will be redirected shortly to the main menu'
 
     gather.say(message)
     resp.append(gather)
     # resp.say("Sorry, I didn't get a reply")
-    resp.redirect(url='/voice', method="POST")
+    resp.redirect(url='/voice?greeted=1', method="POST")
 
 
     return PlainTextResponse(str(resp), media_type="text/xml")
@@ -87,12 +80,11 @@ returns:
 
 
 @router.post("/handle-intent-specific", response_class=PlainTextResponse)
-async def handle_intent_specific(SpeechResult:str = Form(None)) -> PlainTextResponse:
-    global message_case
+async def handle_intent_specific(SpeechResult:str = Form(None), CallSid:str = Form(None), asked:int = Query(0)) -> PlainTextResponse:
     message : str = ''
     resp = VoiceResponse()
 
-    gather = Gather(input="speech", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
+    gather = Gather(input="speech", action="/handle-intent-specific?asked=1", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
 
     data = {}
 
@@ -100,36 +92,32 @@ async def handle_intent_specific(SpeechResult:str = Form(None)) -> PlainTextResp
         print("SpeechResult:", SpeechResult)
 
         try:
-            async with httpx.AsyncClient() as client:
-                res = await client.post(
-                    f"{BASE_URL}/rsp_db",
-                    json={
-                        "text": SpeechResult,
-                        "collection_name": 'docs_824bea41-28d0-4a58-a459-bd50e857e6d2',
-                        "k": 3
-                        },
-                        timeout=10
-                )
-                data = res.json()
+            data = await post_backend(
+                "/rsp_db",
+                {
+                    "text": SpeechResult,
+                    "collection_name": 'docs_824bea41-28d0-4a58-a459-bd50e857e6d2',
+                    "k": 3,
+                    "call_sid": CallSid,
+                },
+            )
         except Exception as e:
-            body_preview = (res.text[:500] if "res" in locals() and hasattr(res, "text") else str(e))
-            print("Backend error or non-JSON response:", body_preview)
+            print("Backend error or non-JSON response:", repr(e))
         
     reply = data.get('text', "Sorry, I didn't get a reply dick.")
 
     if re.search("sms", reply):
         resp.redirect('/message')
 
-    if message_case == 0:
+    if not asked:
         message = 'For ByteMe insurance informations, you may state your question now'
-        message_case = 1
-    elif message_case == 1:
+    else:
         message = f'{reply}. Do you need anything else? If not, you will be redirected shortly to the main menu'
 
     gather.say(message)
     resp.append(gather)
     # resp.say("Sorry, I didn't get a reply")
-    resp.redirect(url='/voice', method="POST")
+    resp.redirect(url='/voice?greeted=1', method="POST")
 
 
     return PlainTextResponse(str(resp), media_type="text/xml")
@@ -155,19 +143,14 @@ async def human_escalation_music() -> PlainTextResponse:
 async def jokes() -> PlainTextResponse:
     resp = VoiceResponse()
     resp.say('Welcome to the local stand up comedy clubs best jokes!')
-    data = {}
-    jokes = []
-
-    for i in range(3):
-        async with httpx.AsyncClient() as client:
-            res = await client.get(
-                f"https://icanhazdadjoke.com/",
-                headers={"Accept": "application/json"}
-            )
-            data = res.json()
-    
-            joke = data.get("joke", "Sorry, no joke for you")
-            jokes.append(joke)
+    results = await asyncio.gather(
+        *(get_json("https://icanhazdadjoke.com/", headers={"Accept": "application/json"}) for _ in range(3)),
+        return_exceptions=True,
+    )
+    jokes = [
+        data.get("joke", "Sorry, no joke for you") if isinstance(data, dict) else "Sorry, no joke for you"
+        for data in results
+    ]
 
     for i in range(3):        
         resp.say(jokes[i])
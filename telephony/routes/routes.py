@@ -1,6 +1,6 @@
 import os
 import re
-from fastapi import FastAPI, Request, Form, APIRouter
+from fastapi import FastAPI, Request, Form, APIRouter, Query
 from fastapi.responses import PlainTextResponse
 import httpx
 from dotenv import load_dotenv
@@ -8,7 +8,6 @@ from twilio.twiml.voice_response import VoiceResponse,  Gather
 from twilio.rest import Client
 from .options import router as option_router
 from .utils import router as utils_router
-from . import options
 
 
 """
@@ -27,12 +26,9 @@ async def root_fallback():
                              media_type="text/xml")
 
 
-firstQuestion : bool = True
-
 @router.post("/voice", response_class=PlainTextResponse)
-async def voice(Digits:int = Form(None)) -> PlainTextResponse:
-    global firstQuestion
-    options.message_case = 0
+async def voice(Digits:int = Form(None), greeted:int = Query(0)) -> PlainTextResponse:
+    # starea meniului vine in query string (action / redirect), nu din memoria procesului
     resp = VoiceResponse()
     
     if Digits:
@@ -43,11 +39,10 @@ async def voice(Digits:int = Form(None)) -> PlainTextResponse:
             elif Digits == 3:
                 resp.redirect('/human-escalation-message')
     
-    gather = Gather(input="dtmf", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
+    gather = Gather(input="dtmf", action="/voice?greeted=1", partialResultCallback="/partial", timeout="5", speechTimeout="auto")
 
-    if firstQuestion:
+    if not greeted:
         gather.say('Hi! Tell me what you need. For general purpose information, press one. For more specific informations, press 2. For speaking with an agent press 3.')
-        firstQuestion = False
     else:
         gather.say('Can I help you with something else? Press one for general purpose and two for more specific.')
     
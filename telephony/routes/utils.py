@@ -2,13 +2,10 @@ import os
 import re
 from fastapi import FastAPI, Request, Form, APIRouter
 from fastapi.responses import PlainTextResponse
-import httpx
 from dotenv import load_dotenv
 from twilio.twiml.voice_response import VoiceResponse,  Gather
 from twilio.rest import Client
-from .options import handle_intent_specific
-from . import routes
-from . import options
+from .backend_client import post_backend
 
 load_dotenv()
 router = APIRouter()
@@ -17,9 +14,6 @@ account_sid = os.environ["TWILIO_ACCOUNT_SID"]
 auth_token = os.environ["TWILIO_AUTH_TOKEN"]
 twilio_phone = os.environ["TWILIO_PHONE_NUMBER"]
 
-BASE_URL = 'https://802126f966c4.ngrok-free.app'
-
-
 """
 Twilio will call this when the call ends (statusCallback).
 You must configure the Twilio number with:
@@ -28,7 +22,7 @@ You must configure the Twilio number with:
 
 
 @router.post("/message")
-async def message():
+async def message(CallSid:str = Form(None)):
     resp = VoiceResponse()
     resp.say('You will receive a SMS regarding your request shortly. ')
     client = Client(account_sid, auth_token)
@@ -38,7 +32,6 @@ async def message():
         to="+40774596204",
         from_=str(twilio_phone)
     )
-    options.message_case = 0    
     resp.redirect(url="/handle-intent-specific", method="POST")
     return PlainTextResponse(str(resp), status_code=200, media_type="text/xml")
 
@@ -51,26 +44,19 @@ async def call_status(request: Request) -> PlainTextResponse:
     duration = form.get("CallDuration")
     call_number = form.get("From", "")
 
-    global firstQuestion
-    global message_case
-
     print(f"Call {call_sid} ended with status={call_status}, duration={duration}, call_number={call_number}")
 
     if call_status == "completed":
-        async with httpx.AsyncClient() as client:
-            try:
-                await client.post(
-                    f"{BASE_URL}/stop_call",
-                    json={
-                        'text': call_number
-                    },
-                    timeout=10
-                )
-            except Exception as e:
-                print("Failed to forward end-of-call event:", e)
-
-    firstQuestion = True
-    message_case = 0
+        try:
+            await post_backend(
+                "/stop_call",
+                {
+                    'text': call_number,
+                    'call_sid': call_sid,
+                },
+            )
+        except Exception as e:
+            print("Failed to forward end-of-call event:", e)
 
     return PlainTextResponse("", status_code=204)
 